@@ -0,0 +1,145 @@
+from sqlalchemy import Integer, case, cast, func, literal_column, select, union_all
+
+import config
+from classification import regime_case, risk_case
+from sql import CountryDB, YearDataDB
+
+SUMMARY_PERCENTILES = {'p10': 0.1, 'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+
+def year_rows(db, year, columns):
+    stmt = (
+        select(CountryDB.name, *[getattr(YearDataDB, c) for c in columns])
+        .join(CountryDB, YearDataDB.country_id == CountryDB.id)
+        .where(YearDataDB.year == year)
+        .order_by(CountryDB.name)
+    )
+    return db.execute(stmt).all()
+
+
+def indicator_summary_select(year, column_name):
+    """
+    Count, mean, min, max and SUMMARY_PERCENTILES of one indicator in one year.
+    Percentiles use ROW_NUMBER/COUNT windows and linear interpolation between
+    neighbouring ranks (same as numpy's default), so no PERCENTILE_CONT is
+    needed and the query runs on SQL Server and SQLite alike.
+    """
+    column = getattr(YearDataDB, column_name)
+    ranked = (
+        select(column.label("value"),
+               func.row_number().over(order_by=column).label("rn"),
+               func.count().over().label("n"))
+        .where(YearDataDB.year == year, column.isnot(None))
+        .subquery()
+    )
+
+    def at_rank(rank):
+        return func.max(case((ranked.c.rn == rank, ranked.c.value)))
+
+    def percentile(p):
+        # 0-based position p * (n - 1); CAST truncates it to the lower rank
+        position = p * (ranked.c.n - 1)
+        lower = cast(position, Integer)
+        low = at_rank(lower + 1)
+        high = func.coalesce(at_rank(lower + 2), low)
+        return low + (high - low) * func.max(position - lower)
+
+    return select(
+        # Nazwa kolumny z naszej listy, wpisana wprost - parametr w SELECT części UNION bywa problemem w SQL Server
+        literal_column(f"'{column_name}'").label("indicator"),
+        func.count(ranked.c.value).label("count"),
+        func.avg(ranked.c.value).label("mean"),
+        func.min(ranked.c.value).label("min"),
+        func.max(ranked.c.value).label("max"),
+        *[percentile(p).label(name) for name, p in SUMMARY_PERCENTILES.items()],
+    )
+
+
+def year_summary(db, year, columns):
+    """Per-indicator statistics and regime band counts for one year, all computed in SQL."""
+    stats = db.execute(union_all(*[indicator_summary_select(year, c) for c in columns])).mappings().all()
+
+    # Grouped over a subquery: SQL Server rejects GROUP BY on a CASE whose parameters differ from the SELECT's
+    banded = (
+        select(regime_case(YearDataDB.system_index).label("regime"))
+        .where(YearDataDB.year == year, YearDataDB.system_index.isnot(None))
+        .subquery()
+    )
+    regime_counts = dict(db.execute(select(banded.c.regime, func.count()).group_by(banded.c.regime)).all())
+    countries = db.execute(select(func.count()).select_from(YearDataDB).where(YearDataDB.year == year)).scalar()
+
+    return {
+        "year": year,
+        "countries": countries,
+        "indicators": {row["indicator"]: {k: v for k, v in row.items() if k != "indicator"} for row in stats},
+        "regimes": {name: regime_counts.get(name, 0) for _, name in config.REGIME_BANDS},
+    }
+
+
+def year_over_year(column, window):
+    """
+    Change since the previous year via LAG over the country's series. Like the
+    feature store, the delta is NULL when the previous row is not year - 1.
+    """
+    previous_year = func.lag(YearDataDB.year).over(**window)
+    return case((previous_year == YearDataDB.year - 1, column - func.lag(column).over(**window)))
+
+
+def trends_select(country_id, columns, rolling_window, year_from=None, year_to=None):
+    """
+    Deltas and rolling means (over the last `rolling_window` recorded years) of
+    one country, plus the risk class of each system_index change. Windows only
+    look back, so year_to filters before them; year_from is applied outside,
+    so the first selected year still sees its predecessors.
+    """
+    window = dict(partition_by=YearDataDB.country_id, order_by=YearDataDB.year)
+    derived = []
+    for name in columns:
+        column = getattr(YearDataDB, name)
+        derived.append(year_over_year(column, window).label(f"{name}_delta"))
+        derived.append(func.avg(column).over(rows=(1 - rolling_window, 0), **window).label(f"{name}_rolling"))
+
+    series = (
+        select(YearDataDB.year,
+               year_over_year(YearDataDB.system_index, window).label("risk_delta"),
+               *derived)
+        .where(YearDataDB.country_id == country_id)
+    )
+    if year_to is not None:
+        series = series.where(YearDataDB.year <= year_to)
+    series = series.subquery()
+
+    stmt = (
+        select(series.c.year,
+               *[series.c[label.name] for label in derived],
+               risk_case(series.c.risk_delta).label("risk_class"))
+        .order_by(series.c.year)
+    )
+    if year_from is not None:
+        stmt = stmt.where(series.c.year >= year_from)
+    return stmt
+
+
+def alerts_select(risk_classes, year_from=None, year_to=None):
+    """Country-years whose system_index change crosses the crisis or improvement threshold."""
+    window = dict(partition_by=YearDataDB.country_id, order_by=YearDataDB.year)
+    changes = select(YearDataDB.country_id, YearDataDB.year, YearDataDB.system_index,
+                     year_over_year(YearDataDB.system_index, window).label("delta"))
+    # The delta only looks one year back, so earlier years can be skipped before the window runs
+    if year_from is not None:
+        changes = changes.where(YearDataDB.year >= year_from - 1)
+    if year_to is not None:
+        changes = changes.where(YearDataDB.year <= year_to)
+    changes = changes.subquery()
+
+    risk_class = risk_case(changes.c.delta)
+    stmt = (
+        select(CountryDB.name, changes.c.year, changes.c.system_index, changes.c.delta,
+               risk_class.label("risk_class"))
+        .join(CountryDB, changes.c.country_id == CountryDB.id)
+        .where(risk_class.in_(risk_classes))
+        .order_by(changes.c.year.desc(), CountryDB.name)
+    )
+    if year_from is not None:
+        stmt = stmt.where(changes.c.year >= year_from)
+    return stmt
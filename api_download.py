@@ -1,13 +1,140 @@
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 import pandas as pd
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = "http://127.0.0.1:8000"
+DEFAULT_WORKERS = 8
+
+# Local copies of /panel (kept up to date from /changes) and of /features
+# (from /features?since=); each cursor is saved next to its snapshot
+SNAPSHOT_PATH = os.path.join("cache", "panel_snapshot.parquet")
+FEATURE_SNAPSHOT_PATH = os.path.join("cache", "feature_snapshot.parquet")
+
+
+def fetch_panel_dataframe(year_from=None, year_to=None, countries=None, columns=None):
+    params = {"format": "csv", "year_from": year_from, "year_to": year_to,
+              "countries": countries, "columns": columns}
+
+    response = requests.get(f"{BASE_URL}/panel", params=params)
+    if response.status_code != 200:
+        raise Exception(f"Download failed: {response.status_code}")
+
+    return pd.read_csv(io.BytesIO(response.content))
+
+
+def fetch_changes(since=None, endpoint="/changes"):
+    """Rows changed after the cursor (all rows without one) and the next cursor; (None, None) on 410."""
+    response = requests.get(f"{BASE_URL}{endpoint}", params={"format": "csv", "since": since})
+    if response.status_code == 410:
+        return None, None
+    if response.status_code != 200:
+        raise Exception(f"Download failed: {response.status_code}")
+
+    return pd.read_csv(io.BytesIO(response.content)), response.headers["X-Change-Cursor"]
+
+
+def write_cursor(path, cursor):
+    with open(path, "w") as f:
+        f.write(cursor)
+
+
+def write_atomic(path, write):
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def sync_snapshot(path, endpoint):
+    """
+    Brings a local Parquet snapshot of a change feed (`endpoint`) up to date:
+    only rows changed since the stored cursor are downloaded and upserted by
+    (Country, year). Without a snapshot, or when the server rejects the
+    cursor, everything is downloaded.
+    """
+    cursor_path = path + ".cursor"
+    snapshot = cursor = None
+    if os.path.exists(path) and os.path.exists(cursor_path):
+        snapshot = pd.read_parquet(path)
+        with open(cursor_path) as f:
+            cursor = f.read().strip()
+
+    changes, new_cursor = fetch_changes(cursor, endpoint) if cursor else (None, None)
+    if changes is None:
+        if cursor:
+            print(f"♻️ Snapshot cursor rejected by the server, downloading the full {endpoint}")
+        snapshot = None
+        changes, new_cursor = fetch_changes(None, endpoint)
+        if changes is None:
+            raise Exception("Download failed: full change feed rejected")
+
+    if new_cursor == cursor:
+        print(f"📦 Snapshot up to date: {len(snapshot)} records")
+        return snapshot
+
+    if snapshot is not None:
+        print(f"🔄 {len(changes)} changed records applied to the snapshot")
+        # Zmieniony wiersz zastępuje swoją starą wersję (ten sam kraj i rok)
+        changes = pd.concat([snapshot, changes], ignore_index=True).drop_duplicates(['Country', 'year'], keep='last')
+    panel = changes.sort_values(by=['Country', 'year']).reset_index(drop=True)
+
+    # Snapshot first, cursor second: after a crash in between the same changes are simply applied again
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    write_atomic(path, lambda tmp_path: panel.to_parquet(tmp_path, index=False))
+    write_atomic(cursor_path, lambda tmp_path: write_cursor(tmp_path, new_cursor))
+    return panel
 
-def fetch_full_dataframe():
-    print("📡 Downloading API...")
+
+def sync_panel_snapshot(path=SNAPSHOT_PATH):
+    return sync_snapshot(path, "/changes")
+
+
+def sync_feature_snapshot(path=None):
+    # Training rows: after the first run only feature rows recomputed since the last one are downloaded
+    df = sync_snapshot(path or FEATURE_SNAPSHOT_PATH, "/features")
+    print(f"✅ Training snapshot: {len(df)} feature rows.")
+    return df
+
+
+def make_session(workers=DEFAULT_WORKERS):
+    # One keep-alive pool shared by all workers, with retries on transient failures
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def fetch_country(session, country_name):
+    start = time.perf_counter()
+    get_data = session.get(f"{BASE_URL}/countries/{country_name}")
+    elapsed = time.perf_counter() - start
+
+    if get_data.status_code != 200:
+        print(f"⚠️ Failed download for: {country_name}")
+        return None, elapsed
+
+    details = get_data.json()
+    if 'data' in details and details['data']:
+        df_temp = pd.DataFrame(details['data'])
+        df_temp['Country'] = country_name
+        return df_temp, elapsed
+    return None, elapsed
+
+
+def fetch_per_country_dataframe(workers=DEFAULT_WORKERS):
+    session = make_session(workers)
 
     try:
-        response_list = requests.get(f"{BASE_URL}/countries")
+        response_list = session.get(f"{BASE_URL}/countries")
         if response_list.status_code != 200:
             raise Exception(f"Download failed: {response_list.status_code}")
 
@@ -18,24 +145,38 @@ def fetch_full_dataframe():
         print(f"❌ Problem: {e}")
         return pd.DataFrame()
 
-    all_data_frames = []
-
-    for item in countries_list:
-        country_name = item['name']
-        get_data = requests.get(f"{BASE_URL}/countries/{country_name}")
+    country_names = [item['name'] for item in countries_list]
+    start = time.perf_counter()
 
-        if get_data.status_code == 200:
-            details = get_data.json()
+    # map() keeps the order of the country list, so the result matches the serial loop
+    with session, ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda name: fetch_country(session, name), country_names))
 
-            if 'data' in details and details['data']:
-                df_temp = pd.DataFrame(details['data'])
-                df_temp['Country'] = country_name
-                all_data_frames.append(df_temp)
-        else:
-            print(f"⚠️ Failed download for: {country_name}")
+    if country_names:
+        timings = pd.Series([elapsed for _, elapsed in results], index=country_names)
+        print(f"⏱️ {len(country_names)} countries in {time.perf_counter() - start:.2f}s "
+              f"({workers} workers), median {timings.median():.3f}s per country")
+        print("🐢 Slowest: " + ", ".join(f"{name} {t:.3f}s" for name, t in timings.nlargest(5).items()))
 
+    all_data_frames = [df_temp for df_temp, _ in results if df_temp is not None]
     if all_data_frames:
-        full_df = pd.concat(all_data_frames, ignore_index=True)
+        return pd.concat(all_data_frames, ignore_index=True)
+    return pd.DataFrame()
+
+
+def fetch_full_dataframe(bulk=True, workers=DEFAULT_WORKERS, incremental=True):
+    print("📡 Downloading API...")
+
+    if bulk:
+        try:
+            full_df = sync_panel_snapshot() if incremental else fetch_panel_dataframe()
+        except Exception as e:
+            print(f"❌ Problem: {e}")
+            return pd.DataFrame()
+    else:
+        full_df = fetch_per_country_dataframe(workers)
+
+    if not full_df.empty:
         full_df['year'] = pd.to_numeric(full_df['year'])
         full_df = full_df.sort_values(by=['Country', 'year']).reset_index(drop=True)
         print(f"✅ Downloaded {len(full_df)} records.")
@@ -47,4 +188,3 @@ def fetch_full_dataframe():
 if __name__ == "__main__":
     df = fetch_full_dataframe()
     print(df.head())
-
@@ -0,0 +1,23 @@
+import os
+import shutil
+
+import blob_service
+
+# Filesystem stand-in for Azure Blob Storage: "uploaded" backups are moved to BENCH_BLOB_DIR
+BLOB_DIR = os.environ["BENCH_BLOB_DIR"]
+
+
+def upload_file_to_blob(file_content, filename, blob_name=None):
+    path = os.path.join(BLOB_DIR, blob_name or filename)
+    with open(path, "wb") as f:
+        shutil.copyfileobj(file_content, f)
+    return f"file://{path}"
+
+
+# Any non-empty value: without one, upload_spooled_backup() leaves every backup in the spool
+blob_service.CONNECTION_STRING = "bench-filesystem"
+blob_service.get_container_client = lambda: None
+blob_service.upload_file_to_blob = upload_file_to_blob
+blob_service.get_blob_url = lambda blob_name: f"file://{os.path.join(BLOB_DIR, blob_name)}"
+
+from main import app  # noqa: E402  (after the stand-in is installed)
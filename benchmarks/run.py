@@ -0,0 +1,292 @@
+"""
+Offline benchmark suite: SQLite + a filesystem blob stand-in, synthetic data.
+
+    python benchmarks/run.py                       # 220 x 60 and 10x that
+    python benchmarks/run.py --scales 1 --compare benchmarks/results/<older>.json
+
+Every run writes one JSON file to benchmarks/results/, named after the commit.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import requests  # noqa: E402
+
+import api_download  # noqa: E402
+import config  # noqa: E402
+import model_pipeline  # noqa: E402
+from profiling import StageProfiler  # noqa: E402
+
+BASE_COUNTRIES = 220
+YEARS = list(range(1965, 2025))
+INDICATORS = ['press_free', 'freedom_index', 'gdp', 'absence_of_violence', 'civil_liberties',
+              'gov_stability', 'human_rights', 'electoral_integrity', 'system_index']
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def synthetic_panel(n_countries, seed=0):
+    # Random walk for system_index, noise with ~5% missing values for the other indicators
+    rng = np.random.default_rng(seed)
+    n = n_countries * len(YEARS)
+    df = pd.DataFrame({
+        'Country': np.repeat([f"Country {i:04d}" for i in range(n_countries)], len(YEARS)),
+        'year': np.tile(YEARS, n_countries),
+    })
+    steps = rng.normal(0, 0.3, (n_countries, len(YEARS)))
+    df['system_index'] = np.clip(rng.uniform(1, 9, (n_countries, 1)) + steps.cumsum(axis=1), 0, 10).ravel()
+    for col in INDICATORS[:-1]:
+        df[col] = rng.uniform(0, 100, n)
+    df['gdp'] = rng.normal(2, 5, n)
+    for col in INDICATORS[:-1]:
+        df.loc[rng.random(n) < 0.05, col] = np.nan
+    return df
+
+
+def to_csv(df):
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def latency_stats(latencies):
+    ms = np.array(latencies) * 1000
+    return {'n': len(ms), 'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)), 'mean_ms': float(ms.mean())}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+@contextlib.contextmanager
+def local_server(workdir):
+    """uvicorn in a child process, on a fresh SQLite database and a blob directory."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    env = {**os.environ,
+           "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+           "BACKUP_SPOOL_DIR": os.path.join(workdir, "spool"),
+           "BENCH_BLOB_DIR": os.path.join(workdir, "blobs")}
+    # local_app.py installs its own stand-in, a real connection string must not reach Azure
+    env.pop("AZURE_STORAGE_CONNECTION_STRING", None)
+    os.makedirs(env["BENCH_BLOB_DIR"])
+
+    subprocess.run([sys.executable, "sql.py", "migrate"], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "local_app:app", "--app-dir", "benchmarks",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(300):
+            try:
+                requests.get(f"{base_url}/docs", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def bench_upload_csv(base_url, panel, n_countries):
+    # Jeden kraj = jeden plik, jak przy ręcznym wgrywaniu
+    session = requests.Session()
+    names = panel['Country'].unique()[:n_countries]
+    latencies, rows = [], 0
+    for name in names:
+        session.post(f"{base_url}/countries", json={"name": name})
+        body = to_csv(panel[panel['Country'] == name].drop(columns='Country'))
+        response, elapsed = timed(session.post, f"{base_url}/countries/{name}/upload-csv",
+                                  files={'file': ("country.csv", body, "text/csv")})
+        response.raise_for_status()
+        latencies.append(elapsed)
+        rows += response.json()['rows_added']
+    return {'countries': len(names), 'rows': rows, 'rows_per_s': rows / sum(latencies), **latency_stats(latencies)}
+
+
+def bench_ingest(base_url, panel):
+    # Second upload revises every row, the third sends the same file again (nothing to write)
+    revised = panel.assign(system_index=(panel['system_index'] + 0.01).clip(0, 10))
+    bodies = {'insert': to_csv(panel), 'update': to_csv(revised)}
+    bodies['unchanged'] = bodies['update']
+    result = {'rows': len(panel), 'mb': len(bodies['insert']) / 1024 ** 2}
+    for label, body in bodies.items():
+        response, elapsed = timed(requests.post, f"{base_url}/ingest", files={'file': ("panel.csv", body, "text/csv")})
+        response.raise_for_status()
+        result[label] = {'seconds': elapsed, 'rows_per_s': len(panel) / elapsed, **response.json()}
+        for key in ("status", "backup_url", "backup_status"):
+            result[label].pop(key, None)
+    return result
+
+
+def bench_country_reads(base_url, names, clients, duration, cached):
+    latencies = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        while time.perf_counter() < stop:
+            # Bez cache: każde zapytanie z innym zakresem lat, więc odpowiedź budowana jest od zera
+            params = {} if cached else {'year_from': rng.randint(1000, 1964)}
+            start = time.perf_counter()
+            session.get(f"{base_url}/countries/{rng.choice(names)}", params=params).raise_for_status()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {'clients': clients, 'rps': len(latencies) / duration, **latency_stats(latencies)}
+
+
+def bench_fetch(base_url):
+    api_download.BASE_URL = base_url
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for label, bulk in (("bulk", True), ("per_country", False)):
+            df, elapsed = timed(api_download.fetch_full_dataframe, bulk=bulk, incremental=False)
+            result[label] = {'seconds': elapsed, 'rows': len(df)}
+    return result
+
+
+def bench_model_pipeline(base_url, workdir):
+    # The real model_pipeline.run() (full retrain), timed by its own StageProfiler
+    api_download.BASE_URL = base_url
+    # Fresh snapshot: the fetch stage downloads every feature row, as on a first run
+    api_download.FEATURE_SNAPSHOT_PATH = os.path.join(workdir, "feature_snapshot.parquet")
+    config.MODEL_DIR = os.path.join(workdir, "models")
+    profiler = StageProfiler(enabled=True, output_dir=workdir)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        summary = model_pipeline.run(model_pipeline.parse_args(["--mode", "full", "--profile"]), profiler)
+
+    stages = {s['stage']: {'seconds': s['wall_s'], 'cpu_seconds': s['cpu_s']} for s in profiler.stages}
+    return {'rows': summary['rows'], 'evaluated_rows': summary['evaluated_rows'], 'stages': stages,
+            'total_seconds': sum(s['seconds'] for s in stages.values())}
+
+
+def run_scale(scale, args):
+    n_countries = BASE_COUNTRIES * scale
+    panel = synthetic_panel(n_countries)
+    print(f"\n📏 Scale {scale}x: {n_countries} countries x {len(YEARS)} years = {len(panel)} rows")
+
+    with tempfile.TemporaryDirectory() as workdir, local_server(workdir) as base_url:
+        result = {'countries': n_countries, 'rows': len(panel)}
+
+        upload_set = panel[panel['Country'].isin(panel['Country'].unique()[:args.upload_countries])]
+        result['upload_csv'] = bench_upload_csv(base_url, upload_set, args.upload_countries)
+        print(f"  upload-csv: {result['upload_csv']['rows_per_s']:.0f} rows/s, p50 {result['upload_csv']['p50_ms']:.1f} ms")
+
+        result['ingest'] = bench_ingest(base_url, panel)
+        print(f"  ingest: insert {result['ingest']['insert']['seconds']:.2f}s, update {result['ingest']['update']['seconds']:.2f}s, "
+              f"unchanged {result['ingest']['unchanged']['seconds']:.2f}s")
+
+        names = list(panel['Country'].unique())
+        result['get_country'] = {}
+        for label, cached in (("cached", True), ("uncached", False)):
+            reads = bench_country_reads(base_url, names, args.clients, args.duration, cached)
+            result['get_country'][label] = reads
+            print(f"  GET /countries/{{name}} {label}: {reads['rps']:.0f} rps, p95 {reads['p95_ms']:.1f} ms")
+
+        result['fetch_full_dataframe'] = bench_fetch(base_url)
+        print(f"  fetch_full_dataframe: bulk {result['fetch_full_dataframe']['bulk']['seconds']:.2f}s, "
+              f"per-country {result['fetch_full_dataframe']['per_country']['seconds']:.2f}s")
+
+        result['model_pipeline'] = bench_model_pipeline(base_url, workdir)
+        print("  model_pipeline: " + ", ".join(f"{name} {s['seconds']:.2f}s"
+                                                for name, s in result['model_pipeline']['stages'].items()))
+
+        # Backups are shipped by background tasks after each upload response; none should be left
+        spool = os.path.join(workdir, "spool")
+        result['backups'] = {'uploaded': len(os.listdir(os.path.join(workdir, "blobs"))),
+                             'left_in_spool': len(os.listdir(spool)) if os.path.isdir(spool) else 0}
+        print(f"  backups: {result['backups']['uploaded']} uploaded, {result['backups']['left_in_spool']} left in spool")
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def flatten(result, prefix=""):
+    # {'ingest': {'insert': {'seconds': 1.2}}} -> {'ingest.insert.seconds': 1.2}
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(old_path, new_report):
+    with open(old_path) as f:
+        old = flatten(json.load(f)['results'])
+    new = flatten(new_report['results'])
+    print(f"\n📊 Compared with {old_path}")
+    for key in sorted(old.keys() & new.keys()):
+        if key.endswith(("seconds", "_ms", "rps", "rows_per_s")) and old[key]:
+            print(f"  {key:<60}{old[key]:>12.3f}{new[key]:>12.3f}{new[key] / old[key]:>8.2f}x")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="POLKA offline benchmarks")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10], help="multiples of 220 countries")
+    parser.add_argument("--upload-countries", type=int, default=50, help="countries sent through upload-csv")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent GET clients")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per GET phase")
+    parser.add_argument("--output", help="report path (default: benchmarks/results/<time>_<commit>.json)")
+    parser.add_argument("--compare", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    report = {
+        'commit': git_commit(),
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'settings': vars(args),
+        'results': {f"scale_{scale}": run_scale(scale, args) for scale in args.scales},
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Report: {output}")
+
+    if args.compare:
+        compare(args.compare, report)
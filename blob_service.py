@@ -1,32 +1,177 @@
 import os
+import time
 from azure.storage.blob import BlobServiceClient
 from azure.core.exceptions import ResourceExistsError
 import uuid
 from dotenv import load_dotenv
 
+from metrics import BLOB_UPLOAD_SECONDS, BLOB_UPLOAD_FAILURES
+
 load_dotenv()
 
 CONNECTION_STRING = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
 CONTAINER_NAME = "raw-csv-uploads"
+SPOOL_DIR = os.getenv("BACKUP_SPOOL_DIR", "backup_spool")
+UPLOAD_ATTEMPTS = 3
+RETRY_DELAY = 2.0
+# Spool sweep of every worker; a claim older than STALE_CLAIM_SECONDS belongs to a process that died mid-upload
+BACKUP_RETRY_INTERVAL = float(os.getenv("BACKUP_RETRY_INTERVAL", "300"))
+STALE_CLAIM_SECONDS = 600
 
-if not CONNECTION_STRING:
-    raise ValueError("Missing AZURE_STORAGE_CONNECTION_STRING in the .env file!")
+_blob_service_client = None
+_container_client = None
 
-blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
 
+def get_blob_service_client():
+    # Created on first use: importing this module needs no connection string
+    global _blob_service_client
+    if _blob_service_client is None:
+        if not CONNECTION_STRING:
+            raise ValueError("Missing AZURE_STORAGE_CONNECTION_STRING in the .env file!")
+        _blob_service_client = BlobServiceClient.from_connection_string(CONNECTION_STRING)
+    return _blob_service_client
 
-def upload_file_to_blob(file_content: bytes, filename: str) -> str:
-    container_client = blob_service_client.get_container_client(CONTAINER_NAME)
-    try:
-        container_client.create_container()
-        print(f"☁️ Created a new container in Azurite: {CONTAINER_NAME}")
-    except ResourceExistsError:
-        pass
 
-    unique_filename = f"{uuid.uuid4()}_{filename}"
+def get_container_client():
+    # The container is created (or found) once per process, not on every upload
+    global _container_client
+    if _container_client is None:
+        container_client = get_blob_service_client().get_container_client(CONTAINER_NAME)
+        try:
+            container_client.create_container()
+            print(f"☁️ Created a new container in Azurite: {CONTAINER_NAME}")
+        except ResourceExistsError:
+            pass
+        _container_client = container_client
+    return _container_client
+
+
+def get_blob_url(blob_name: str):
+    # Bez skonfigurowanego blob storage kopia zostaje w SPOOL_DIR i nie ma jeszcze URL
+    if not CONNECTION_STRING:
+        return None
+    return get_blob_service_client().get_blob_client(CONTAINER_NAME, blob_name).url
+
+
+def upload_file_to_blob(file_content, filename: str, blob_name: str = None) -> str:
+    container_client = get_container_client()
+
+    unique_filename = blob_name or f"{uuid.uuid4()}_{filename}"
 
     blob_client = container_client.get_blob_client(blob=unique_filename)
 
-    blob_client.upload_blob(file_content, overwrite=True)
+    with BLOB_UPLOAD_SECONDS.time():
+        blob_client.upload_blob(file_content, overwrite=True)
+
+    return blob_client.url
+
+
+class BackupSpool:
+    """
+    Local copy of an upload, written while the upload is parsed and shipped to
+    blob storage afterwards. Committed files stay in SPOOL_DIR until the upload
+    succeeds, so a failed backup is retried by the next spool sweep.
+    """
+
+    def __init__(self, filename: str):
+        os.makedirs(SPOOL_DIR, exist_ok=True)
+        self.blob_name = f"{uuid.uuid4()}_{os.path.basename(filename)}"
+        self.path = os.path.join(SPOOL_DIR, self.blob_name)
+        self.file = open(self.path + ".part", "wb")
+
+    def write(self, data: bytes):
+        self.file.write(data)
+
+    def commit(self) -> str:
+        self.file.close()
+        os.replace(self.path + ".part", self.path)
+        return self.blob_name
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.path + ".part")
+
+
+def claim_backup(blob_name: str):
+    """
+    Renames a committed spool file to `.uploading` so that only one thread in
+    one worker uploads it. Returns the claimed path, or None if another
+    upload already claimed (or finished) it.
+    """
+    path = os.path.join(SPOOL_DIR, blob_name)
+    try:
+        os.replace(path, path + ".uploading")
+    except FileNotFoundError:
+        return None
+    # Czas przejęcia, nie zapisu pliku: po nim rozpoznajemy porzucone przejęcia
+    os.utime(path + ".uploading")
+    return path + ".uploading"
+
+
+def upload_spooled_backup(blob_name: str) -> bool:
+    # Bez blob storage (testy, lokalne uruchomienia) plik po prostu zostaje w SPOOL_DIR
+    if not CONNECTION_STRING:
+        return False
+
+    claimed = claim_backup(blob_name)
+    if claimed is None:
+        return True
+
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            with open(claimed, "rb") as f:
+                upload_file_to_blob(f, blob_name, blob_name=blob_name)
+            os.remove(claimed)
+            return True
+        except Exception as e:
+            BLOB_UPLOAD_FAILURES.inc()
+            print(f"⚠️ Backup upload failed ({attempt}/{UPLOAD_ATTEMPTS}) for {blob_name}: {e}")
+            if attempt < UPLOAD_ATTEMPTS:
+                time.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+    # Back to the spool for the next sweep
+    os.replace(claimed, os.path.join(SPOOL_DIR, blob_name))
+    return False
+
+
+def release_stale_claims():
+    now = time.time()
+    for name in os.listdir(SPOOL_DIR):
+        path = os.path.join(SPOOL_DIR, name)
+        if not name.endswith(".uploading"):
+            continue
+        try:
+            if now - os.path.getmtime(path) > STALE_CLAIM_SECONDS:
+                os.replace(path, path.removesuffix(".uploading"))
+        except FileNotFoundError:
+            pass
+
+
+def retry_pending_backups():
+    if not os.path.isdir(SPOOL_DIR):
+        return
+
+    release_stale_claims()
+    pending = [name for name in os.listdir(SPOOL_DIR) if not name.endswith((".part", ".uploading"))]
+    if pending:
+        print(f"☁️ Retrying {len(pending)} pending backups...")
+    for blob_name in pending:
+        upload_spooled_backup(blob_name)
+
 
-    return blob_client.url
\ No newline at end of file
+def start_backup_service():
+    """
+    Runs in a daemon thread of every worker: sweeps the spool at startup and
+    then every BACKUP_RETRY_INTERVAL seconds, so backups that failed during a
+    storage outage are shipped once it is over, without a restart.
+    """
+    if not CONNECTION_STRING:
+        print(f"☁️ No AZURE_STORAGE_CONNECTION_STRING, upload backups stay in {SPOOL_DIR}/")
+        return
+    while True:
+        try:
+            get_container_client()
+            retry_pending_backups()
+        except Exception as e:
+            print(f"⚠️ Blob storage unavailable, backups will be retried: {e}")
+        time.sleep(BACKUP_RETRY_INTERVAL)
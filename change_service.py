@@ -0,0 +1,72 @@
+import secrets
+
+from sqlalchemy import select, update
+
+from sql import ChangeCounterDB, CountryDB, FeatureRowDB, YearDataDB
+
+# Change feed of political_data (and of political_features, recomputed in the
+# same transactions). Every write transaction takes the next
+# change_counter.version and stamps it on the rows it inserts or updates.
+# The UPDATE keeps the counter row locked until commit, so writers commit in
+# version order: once version N is visible, so is everything before it, and a
+# cursor never skips a row committed later with a lower version.
+# Rows are written with a pending stamp first and get the version in
+# stamp_changes() right before commit, so the lock is not held while an
+# upload is parsed and written.
+
+PENDING_KEY = "pending_change_version"
+
+
+def next_change_version(db) -> int:
+    """Increments the counter inside the caller's transaction; call it right before commit."""
+    db.execute(update(ChangeCounterDB).where(ChangeCounterDB.id == 1)
+               .values(version=ChangeCounterDB.version + 1))
+    return db.execute(select(ChangeCounterDB.version).where(ChangeCounterDB.id == 1)).scalar_one()
+
+
+def pending_change_version(db) -> int:
+    # Negative, so never inside a cursor range, and random, so concurrent transactions do not share it
+    return db.info.setdefault(PENDING_KEY, -1 - secrets.randbits(62))
+
+
+def stamp_changes(db) -> int:
+    """Takes the next version and moves the rows written with the pending stamp to it."""
+    version = next_change_version(db)
+    pending = db.info.pop(PENDING_KEY, None)
+    if pending is not None:
+        for model in (YearDataDB, FeatureRowDB):
+            db.execute(update(model).where(model.change_version == pending)
+                       .values(change_version=version).execution_options(synchronize_session=False))
+    return version
+
+
+def current_change_version(db):
+    epoch, version = db.execute(select(ChangeCounterDB.epoch, ChangeCounterDB.version)
+                                .where(ChangeCounterDB.id == 1)).one()
+    return epoch, version
+
+
+def format_cursor(epoch: str, version: int) -> str:
+    return f"{epoch}.{version}"
+
+
+def parse_cursor(cursor: str):
+    # ValueError for anything that is not "<epoch>.<version>"
+    epoch, version = cursor.rsplit(".", 1)
+    return epoch, int(version)
+
+
+def changes_select(columns, since_version, up_to_version):
+    """
+    Rows written after `since_version` (all rows when None) up to the version
+    read at the start of the request. `columns` as in /panel.
+    """
+    stmt = (
+        select(*[CountryDB.name if c == "Country" else getattr(YearDataDB, c) for c in columns])
+        .join(CountryDB, YearDataDB.country_id == CountryDB.id)
+        .where(YearDataDB.change_version <= up_to_version)
+        .order_by(YearDataDB.change_version, YearDataDB.id)
+    )
+    if since_version is not None:
+        stmt = stmt.where(YearDataDB.change_version > since_version)
+    return stmt
@@ -0,0 +1,35 @@
+from sqlalchemy import case
+
+import config
+
+
+def classify_system_type(index):
+
+    for threshold, name in config.REGIME_BANDS:
+        if index > threshold:
+            return name
+    return config.REGIME_BANDS[-1][1]
+
+def classify_risk(delta_y):
+
+    if delta_y <= config.CRISIS_THRESHOLD:
+        return 1  #🔴
+    elif delta_y >= config.IMPROVEMENT_THRESHOLD:
+        return 2  #🔵
+    else:
+        return 0  #🟢
+
+
+def regime_case(index_column):
+    # classify_system_type as a SQL CASE expression, for grouping inside the database
+    bands = config.REGIME_BANDS
+    return case(*[(index_column > threshold, name) for threshold, name in bands[:-1]], else_=bands[-1][1])
+
+
+def risk_case(delta_column):
+    # classify_risk as a SQL CASE; a NULL delta (first year, gap in the series) stays NULL
+    return case(
+        (delta_column <= config.CRISIS_THRESHOLD, 1),
+        (delta_column >= config.IMPROVEMENT_THRESHOLD, 2),
+        (delta_column.isnot(None), 0),
+    )
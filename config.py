@@ -5,6 +5,12 @@ FEATURES = ["press_free", "freedom_index", "gdp", "absence_of_violence",
 TARGET_BASE = 'system_index'
 TARGET_NEXT_YEAR = 'system_next_year'
 
+# Feature store: values from k years earlier (X_{t-k}) and the change since last year
+FEATURE_LAGS = [1, 2]
+LAG_FEATURES = [f"{col}_lag{lag}" for lag in FEATURE_LAGS for col in FEATURES]
+DELTA_FEATURES = [f"{col}_delta" for col in FEATURES]
+MODEL_FEATURES = FEATURES + LAG_FEATURES + DELTA_FEATURES
+
 XGB_PARAMS = {
     'n_estimators': 200,
     'learning_rate': 0.05,
@@ -14,4 +20,18 @@ XGB_PARAMS = {
 }
 
 CRISIS_THRESHOLD = -0.5
-IMPROVEMENT_THRESHOLD = 0.5
\ No newline at end of file
+IMPROVEMENT_THRESHOLD = 0.5
+# Rolling means of /countries/{name}/trends: default number of recorded years
+TREND_WINDOW = 3
+
+# EIU regime categories: (lower bound, exclusive) -> name, checked top-down
+REGIME_BANDS = [
+    (8.0, "Full democracies"),
+    (6.0, "Flawed democracies"),
+    (4.0, "Hybrid regimes"),
+    (float("-inf"), "Authoritarian regimes"),
+]
+
+# Model registry (model_registry.py); warm-start adds this many trees to the active model
+MODEL_DIR = "models"
+WARM_START_ROUNDS = 50
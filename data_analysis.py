@@ -1,270 +1,292 @@
+import hashlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
-from functools import reduce
+import requests
+
+from profiling import peak_rss_mb
+
+BASE_URL = "http://127.0.0.1:8000"
+CACHE_DIR = "cache"
+# Bump when the cleaning code changes, so cached panels built by older code are not reused
+PIPELINE_VERSION = 2
+
+SOURCE_FILES = [
+    'data/world_press_freedom_Index.csv',
+    'V-Dem-CY-Core-v15.csv',
+    'data/world_gdp_data.csv',
+    'data/absence_of_violence.csv',
+    'data/civil-liberties-index-eiu.csv',
+    'data/ti-corruption-perception-index.csv',
+    'data/human-rights-index-vdem.csv',
+    'data/electoral-democracy-index.csv',
+    'data/democracy-index-eiu.csv',
+    'data/country_list.CSV',
+]
+
+api_columns = [
+    'year',
+    'press_free',
+    'freedom_index',
+    'gdp',
+    'absence_of_violence',
+    'civil_liberties',
+    'gov_stability',
+    'human_rights',
+    'electoral_integrity',
+    'system_index'
+]
+
+
+def describe(df, label):
+    country_count = df["Country"].nunique()
+    year_count = df["Year"].nunique()
+    oldest_year = df["Year"].min()
+    newest_year = df["Year"].max()
+
+    print(f'{label}, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
+
+
+def compact(df, value_column):
+    # Kompaktowe typy: Country jako category, Year jako int16, wskaźniki jako float32
+    df['Country'] = df['Country'].astype(str).str.strip().astype('category')
+    df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+    df = df.dropna(subset=['Year'])
+    df['Year'] = df['Year'].astype('int16')
+    df[value_column] = df[value_column].astype('float32')
+    return df
+
 
 #DATA
 #1. press_free
-fp_id = pd.read_csv('data/world_press_freedom_Index.csv')
-fp_id.drop(['STRUCTURE', 'STRUCTURE_ID', 'ACTION', 'FREQ', 'REF_AREA', 'INDICATOR', 'SEX', 'AGE', 'URBANISATION', 'UNIT_MEASURE', 'COMP_BREAKDOWN_1', 'COMP_BREAKDOWN_2', 'COMP_BREAKDOWN_3', 'UNIT_TYPE', 'DATABASE_ID', 'TIME_FORMAT', 'UNIT_MULT', 'DATA_SOURCE', 'OBS_CONF', 'OBS_STATUS', 'FREQ_LABEL', 'INDICATOR_LABEL', 'SEX_LABEL', 'AGE_LABEL', 'URBANISATION_LABEL', 'UNIT_MEASURE_LABEL', 'COMP_BREAKDOWN_1_LABEL', 'COMP_BREAKDOWN_2_LABEL', 'COMP_BREAKDOWN_3_LABEL', 'UNIT_TYPE_LABEL', 'DATABASE_ID_LABEL', 'TIME_FORMAT_LABEL', 'UNIT_MULT_LABEL', 'OBS_STATUS_LABEL', 'OBS_CONF_LABEL'], axis=1, inplace=True, errors='ignore')
+def load_press_freedom():
+    fp_id = pd.read_csv(
+        'data/world_press_freedom_Index.csv',
+        usecols=lambda c: c == 'REF_AREA_LABEL' or c.isdigit(),
+        dtype={'REF_AREA_LABEL': 'str'},
+    )
 
-fp_id = fp_id.rename(columns={'REF_AREA_LABEL': 'Country'})
+    fp_id = fp_id.rename(columns={'REF_AREA_LABEL': 'Country'})
 
-fp_id = fp_id.melt(
-    id_vars=['Country'],
-    var_name='Year',
-    value_name='press_free'
-)
-country_count = fp_id["Country"].nunique()
-year_count = fp_id["Year"].nunique()
-oldest_year = fp_id["Year"].min()
-newest_year = fp_id["Year"].max()
+    fp_id = fp_id.melt(
+        id_vars=['Country'],
+        var_name='Year',
+        value_name='press_free'
+    )
+    fp_id = compact(fp_id, 'press_free')
+    describe(fp_id, 'World Press Free Index')
+    return fp_id
 
-print(f'World Press Free Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
 
 #2. freedom_index
-free_id = pd.read_csv('V-Dem-CY-Core-v15.csv')
-columns = ['country_name', 'year', 'v2x_polyarchy']
-free_id = free_id[columns]
+def load_freedom_index():
+    free_id = pd.read_csv(
+        'V-Dem-CY-Core-v15.csv',
+        usecols=['country_name', 'year', 'v2x_polyarchy'],
+        dtype={'country_name': 'str', 'year': 'int16', 'v2x_polyarchy': 'float32'},
+    )
 
-free_id.columns = free_id.columns.str.replace(r'v2x_polyarchy', 'freedom_index', regex=True)
-free_id.columns = free_id.columns.str.replace(r'year', 'Year', regex=True)
-free_id.columns = free_id.columns.str.replace(r'country_name', 'Country', regex=True)
+    free_id = free_id.rename(columns={
+        'country_name': 'Country',
+        'year': 'Year',
+        'v2x_polyarchy': 'freedom_index',
+    })
 
-country_count = free_id["Country"].nunique()
-year_count = free_id["Year"].nunique()
-oldest_year = free_id["Year"].min()
-newest_year = free_id["Year"].max()
+    free_id = compact(free_id, 'freedom_index')
+    describe(free_id, 'Freedom Index')
+    return free_id
 
-print(f'Freedom Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
 
 #3.gpd
-gdp_id = pd.read_csv('data/world_gdp_data.csv', encoding='cp1250')
-gdp_id = gdp_id.rename({'Annual GDP growth (percent change)': 'gdp'})
-gdp_id = gdp_id.melt(
-    id_vars=['country_name'],
-    value_vars=[str(y) for y in range(1980, 2025)],
-    var_name='Year',
-    value_name='gdp'
-)
-gdp_id = gdp_id.rename(columns={'country_name': 'Country'})
+def load_gdp():
+    years = [str(y) for y in range(1980, 2025)]
+    gdp_id = pd.read_csv(
+        'data/world_gdp_data.csv',
+        encoding='cp1250',
+        usecols=['country_name'] + years,
+        dtype={**{y: 'float32' for y in years}, 'country_name': 'str'},
+    )
+    gdp_id = gdp_id.melt(
+        id_vars=['country_name'],
+        value_vars=years,
+        var_name='Year',
+        value_name='gdp'
+    )
+    gdp_id = gdp_id.rename(columns={'country_name': 'Country'})
+
+    gdp_id = compact(gdp_id, 'gdp')
+    describe(gdp_id, 'GDP Index')
+    return gdp_id
 
-country_count = gdp_id["Country"].nunique()
-year_count = gdp_id["Year"].nunique()
-oldest_year = gdp_id["Year"].min()
-newest_year = gdp_id["Year"].max()
-
-
-print(f'GDP Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
 
 #4.Political Stability and Absence of Violence/Terrorism: Percentile Rank
 #skala 1-100
-absence_of_violence_id = pd.read_csv(
-    'data/absence_of_violence.csv',
-    skiprows=4,
-    engine='python'
-)
-absence_of_violence_id = absence_of_violence_id.drop(
-    ['Country Code', 'Indicator Name', 'Indicator Code', 'Unnamed: 69'],
-    axis=1,
-    errors='ignore'
-)
-absence_of_violence_id = absence_of_violence_id.rename(columns={'Country Name': 'Country'})
-absence_of_violence_id = absence_of_violence_id.melt(
-    id_vars=['Country'],
-    value_vars=[str(y) for y in range(1960, 2024)],  # kolumny lat jako wartości
-    var_name='Year',                  # nowa kolumna z nazwą roku
-    value_name='absence_of_violence'                 # nowa kolumna z wartościami GDP
-)
-
-country_count = absence_of_violence_id["Country"].nunique()
-year_count = absence_of_violence_id["Year"].nunique()
-oldest_year = absence_of_violence_id["Year"].min()
-newest_year = absence_of_violence_id["Year"].max()
-
-print(f'Absence ofv Violence Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
+def load_absence_of_violence():
+    years = [str(y) for y in range(1960, 2024)]  # kolumny lat jako wartości
+    absence_of_violence_id = pd.read_csv(
+        'data/absence_of_violence.csv',
+        skiprows=4,
+        usecols=['Country Name'] + years,
+        dtype={**{y: 'float32' for y in years}, 'Country Name': 'str'},
+    )
+    absence_of_violence_id = absence_of_violence_id.rename(columns={'Country Name': 'Country'})
+    absence_of_violence_id = absence_of_violence_id.melt(
+        id_vars=['Country'],
+        value_vars=years,
+        var_name='Year',                  # nowa kolumna z nazwą roku
+        value_name='absence_of_violence'                 # nowa kolumna z wartościami
+    )
+
+    absence_of_violence_id = compact(absence_of_violence_id, 'absence_of_violence')
+    describe(absence_of_violence_id, 'Absence ofv Violence Index')
+    return absence_of_violence_id
+
+
+def load_owid(path, value_label, value_column):
+    # Pliki Our World in Data: Entity, Code, Year, <wskaźnik>, World region
+    df = pd.read_csv(
+        path,
+        usecols=['Entity', 'Year', value_label],
+        dtype={'Entity': 'str', value_label: 'float32'},
+    )
+    df = df.rename(columns={'Entity': 'Country', value_label: value_column})
+    return compact(df, value_column)
 
 
 #5 civil_liberties
 #scale 1-10
-civil_liberties_id = pd.read_csv(
-    'data/civil-liberties-index-eiu.csv',
-    engine='python'
-)
-civil_liberties_id.drop(['World region according to OWID','Code'], axis=1, inplace=True)
-civil_liberties_id = civil_liberties_id.rename(columns={'Entity': 'Country'})
-civil_liberties_id = civil_liberties_id.rename(columns={'Civil liberties': 'civil_liberties'})
+def load_civil_liberties():
+    civil_liberties_id = load_owid('data/civil-liberties-index-eiu.csv', 'Civil liberties', 'civil_liberties')
+    describe(civil_liberties_id, 'Civil Liberties Index')
+    return civil_liberties_id
 
-country_count = civil_liberties_id["Country"].nunique()
-year_count = civil_liberties_id["Year"].nunique()
-oldest_year = civil_liberties_id["Year"].min()
-newest_year = civil_liberties_id["Year"].max()
-
-print(f'Civil Liberties Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
 
 #6
 #gov_stability
 #scale 1-100
-cor_per_id = pd.read_csv('data/ti-corruption-perception-index.csv')
-cor_per_id.rename(columns={
-    'Entity': 'Country',
-    'Corruption Perceptions Index': 'gov_stability'
-}, inplace=True)
-
-cor_per_id.drop(
-    columns=['Code', 'World region according to OWID'],
-    axis=1,
-    inplace=True,
-    errors='ignore'
-)
-
-country_count = cor_per_id["Country"].nunique()
-year_count = cor_per_id["Year"].nunique()
-oldest_year = cor_per_id["Year"].min()
-newest_year = cor_per_id["Year"].max()
-
-print(f'Corruption Perceptions Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
+def load_corruption_perception():
+    cor_per_id = load_owid('data/ti-corruption-perception-index.csv', 'Corruption Perceptions Index', 'gov_stability')
+    describe(cor_per_id, 'Corruption Perceptions Index')
+    return cor_per_id
+
 
 #7
 #human_rights
 #scale 0-1
-hum_rig_id = pd.read_csv('data/human-rights-index-vdem.csv')
-hum_rig_id.rename(columns={
-    'Entity': 'Country',
-    'Civil liberties index (central estimate)': 'human_rights'
-}, inplace=True)
-hum_rig_id.drop(
-    columns=['Code', 'World region according to OWID'],
-    axis=1,
-    inplace=True,
-    errors='ignore'
-)
-
-country_count = hum_rig_id["Country"].nunique()
-
-year_count = hum_rig_id["Year"].nunique()
-oldest_year = hum_rig_id["Year"].min()
-newest_year = hum_rig_id["Year"].max()
-
-print(f'Human Rights Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
+def load_human_rights():
+    hum_rig_id = load_owid('data/human-rights-index-vdem.csv', 'Civil liberties index (central estimate)', 'human_rights')
+    describe(hum_rig_id, 'Human Rights Index')
+    return hum_rig_id
+
 
 # 8. electoral_integrity
-ele_int_id = pd.read_csv('data/electoral-democracy-index.csv')
-ele_int_id.rename(columns={
-    'Entity': 'Country',
-    'Electoral democracy index (central estimate)': 'electoral_integrity'
-}, inplace=True)
-ele_int_id.drop(
-    columns=['Code', 'World region according to OWID'],
-    axis=1,
-    inplace=True,
-    errors='ignore'
-)
-
-country_count = ele_int_id["Country"].nunique()
-year_count = ele_int_id["Year"].nunique()
-oldest_year = ele_int_id["Year"].min()
-newest_year = ele_int_id["Year"].max()
-
-print(f'Electoral Integrity Index, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
+def load_electoral_integrity():
+    ele_int_id = load_owid('data/electoral-democracy-index.csv', 'Electoral democracy index (central estimate)',
+                           'electoral_integrity')
+    describe(ele_int_id, 'Electoral Integrity Index')
+    return ele_int_id
+
 
 #Democracy index EIU
-eiu_id = pd.read_csv('data/democracy-index-eiu.csv')
-eiu_id.rename(columns={
-    'Entity': 'Country',
-    'Democracy Index': 'system_index',
-}, inplace=True)
-eiu_id.drop(
-    columns=['Code', 'World region according to OWID'],
-    axis=1,
-    inplace=True,
-    errors='ignore'
-)
-country_count = eiu_id["Country"].nunique()
-year_count = eiu_id["Year"].nunique()
-oldest_year = eiu_id["Year"].min()
-newest_year = eiu_id["Year"].max()
+def load_democracy_index():
+    eiu_id = load_owid('data/democracy-index-eiu.csv', 'Democracy Index', 'system_index')
+    describe(eiu_id, 'Democracy Index EIU')
+    return eiu_id
 
-print(f'Democracy Index EIU, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
 
+SOURCE_LOADERS = [load_press_freedom, load_freedom_index, load_gdp, load_absence_of_violence,
+                  load_civil_liberties, load_corruption_perception, load_human_rights,
+                  load_electoral_integrity, load_democracy_index]
 
-indicators_df = [fp_id, free_id, gdp_id, absence_of_violence_id, civil_liberties_id, cor_per_id, hum_rig_id, ele_int_id, eiu_id]
 
-for df in indicators_df:
-    if 'Country' in df.columns:
-        df['Country'] = df['Country'].astype(str).str.strip()
-    if 'Year' in df.columns:
-        df['Year'] = pd.to_numeric(df['Year'], errors='coerce')
+def build_panel():
+    # Źródła wczytywane równolegle; parser CSV pandas zwalnia GIL
+    with ThreadPoolExecutor(max_workers=len(SOURCE_LOADERS)) as pool:
+        indicators_df = list(pool.map(lambda loader: loader(), SOURCE_LOADERS))
 
-indicators_csv = reduce(lambda left, right: pd.merge(left, right, on=['Country', 'Year'], how='outer'), indicators_df)
-indicators_csv = indicators_csv.sort_values(by=['Country', 'Year']).reset_index(drop=True)
+    # Jeden outer join po indeksie (Country, Year) zamiast łańcucha merge'ów
+    indicators_csv = pd.concat(
+        [df.astype({'Country': 'str'}).set_index(['Country', 'Year']) for df in indicators_df],
+        axis=1,
+        join='outer',
+    ).reset_index()
 
-country_list = pd.read_csv('data/country_list.csv')
-country_list_2025 = country_list["Name"].tolist()
-indicators_csv = indicators_csv[indicators_csv["Country"].isin(country_list_2025)]
+    country_list = pd.read_csv('data/country_list.CSV')
+    country_list_2025 = country_list["Name"].tolist()
+    indicators_csv = indicators_csv[indicators_csv["Country"].isin(country_list_2025)]
 
-country_count = indicators_csv["Country"].nunique()
-year_count = indicators_csv["Year"].nunique()
-oldest_year = indicators_csv["Year"].min()
-newest_year = indicators_csv["Year"].max()
-print(f'Data, number of countries: {country_count}, number of years: {year_count} from {oldest_year}-{newest_year}')
+    indicators_csv['Country'] = indicators_csv['Country'].astype('category')
+    indicators_csv = indicators_csv.sort_values(by=['Country', 'Year']).reset_index(drop=True)
 
-print("Po:", len(indicators_csv))
+    describe(indicators_csv, 'Data')
+    print("Po:", len(indicators_csv))
 
-full = indicators_csv
+    return indicators_csv
 
-print(indicators_csv.columns.tolist())
 
-import requests
-import io
+def source_hash():
+    digest = hashlib.sha256(f"v{PIPELINE_VERSION}".encode())
+    for path in SOURCE_FILES:
+        digest.update(path.encode())
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
 
-BASE_URL = "http://127.0.0.1:8000"
 
-indicators_csv = indicators_csv.rename(columns={'Year': 'year'})
+def load_panel(use_cache=True):
+    """
+    Returns the merged Country-Year panel. The result is cached as Parquet
+    under CACHE_DIR, keyed by a hash of the source files, so the CSVs are
+    parsed again only when one of them changes.
+    """
+    cache_path = os.path.join(CACHE_DIR, f"panel_{source_hash()}.parquet")
 
-api_columns = [
-    'year',
-    'press_free',
-    'freedom_index',
-    'gdp',
-    'absence_of_violence',
-    'civil_liberties',
-    'gov_stability',
-    'human_rights',
-    'electoral_integrity',
-    'system_index'
-]
+    if use_cache and os.path.exists(cache_path):
+        print(f"📦 Panel loaded from cache: {cache_path}")
+        return pd.read_parquet(cache_path)
 
-for country_name, country_data in indicators_csv.groupby('Country'):
-    if not country_name or str(country_name) == 'nan':
-        continue
+    panel = build_panel()
 
-    try:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    panel.to_parquet(cache_path, index=False)
+    print(f"📦 Panel cached: {cache_path}")
+    return panel
 
-        requests.post(f"{BASE_URL}/countries", json={"name": country_name})
-    except Exception:
-        pass
 
-    subset = country_data.copy()
+def upload_panel(panel, base_url=BASE_URL):
+    upload_data = panel[panel['Country'].notna()].rename(columns={'Year': 'year'})
 
     for col in api_columns:
-        if col not in subset.columns:
-            subset[col] = ""
-
-    final_data = subset[api_columns]
+        if col not in upload_data.columns:
+            upload_data[col] = ""
 
     csv_buffer = io.StringIO()
-    final_data.to_csv(csv_buffer, index=False)
-    csv_content = csv_buffer.getvalue()
+    upload_data[['Country'] + api_columns].to_csv(csv_buffer, index=False)
 
-    files = {'file': (f"{country_name}_data.csv", csv_content, "text/csv")}
+    # Jeden plik dla wszystkich krajów zamiast osobnego zapytania na każdy kraj
+    files = {'file': ("indicators.csv", csv_buffer.getvalue(), "text/csv")}
 
     try:
-        response = requests.post(f"{BASE_URL}/countries/{country_name}/upload-csv", files=files)
+        response = requests.post(f"{base_url}/ingest", files=files)
 
         if response.status_code == 200:
-            print(f"✅ {country_name}: Wgrano pomyślnie.")
+            print(f"✅ Wgrano pomyślnie: {response.json()}")
         else:
-            print(f"❌ {country_name}: Błąd API -> {response.text}")
+            print(f"❌ Błąd API -> {response.text}")
 
     except Exception as e:
-        print(f"❌ {country_name}: Błąd połączenia: {e}")
+        print(f"❌ Błąd połączenia: {e}")
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    full = load_panel(use_cache='--no-cache' not in sys.argv)
+    print(f"⏱️ Panel ready in {time.perf_counter() - start:.2f}s, peak RSS {peak_rss_mb():.0f} MB")
+    print(full.columns.tolist())
+    upload_panel(full)
@@ -0,0 +1,113 @@
+import sys
+
+import pandas as pd
+
+import config
+from change_service import pending_change_version, stamp_changes
+from sql import SessionLocal, YearDataDB, FeatureRowDB
+
+SOURCE_COLUMNS = config.FEATURES + [config.TARGET_BASE]
+# Deltas always look one year back, lags up to max(FEATURE_LAGS)
+MAX_LAG = max(config.FEATURE_LAGS + [1])
+INSERT_BATCH_SIZE = 5000
+
+
+def compute_feature_rows(source):
+    """
+    Builds feature rows from political_data rows (country_id, year + indicators).
+    Lags are taken by calendar year (the value at year - k), so a gap in a
+    series gives NaN instead of silently using an older year.
+    """
+    base = source.set_index(['country_id', 'year'])[SOURCE_COLUMNS]
+    country_level = base.index.get_level_values('country_id')
+    year_level = base.index.get_level_values('year')
+
+    def year_shifted(k):
+        moved = base.copy()
+        moved.index = pd.MultiIndex.from_arrays([country_level, year_level + k], names=['country_id', 'year'])
+        return moved.reindex(base.index)
+
+    rows = base.copy()
+    rows[config.TARGET_NEXT_YEAR] = year_shifted(-1)[config.TARGET_BASE]
+
+    lagged = {lag: year_shifted(lag) for lag in sorted(set(config.FEATURE_LAGS + [1]))}
+    for lag in config.FEATURE_LAGS:
+        for col in config.FEATURES:
+            rows[f"{col}_lag{lag}"] = lagged[lag][col]
+    for col in config.FEATURES:
+        rows[f"{col}_delta"] = base[col] - lagged[1][col]
+
+    return rows.reset_index()
+
+
+def load_source(db, country_ids=None, year_from=None, year_to=None):
+    columns = ['country_id', 'year'] + SOURCE_COLUMNS
+    query = db.query(*[getattr(YearDataDB, col) for col in columns])
+    if country_ids is not None:
+        query = query.filter(YearDataDB.country_id.in_(country_ids))
+    if year_from is not None:
+        query = query.filter(YearDataDB.year >= year_from)
+    if year_to is not None:
+        query = query.filter(YearDataDB.year <= year_to)
+    return pd.DataFrame(query.all(), columns=columns).astype({col: float for col in SOURCE_COLUMNS})
+
+
+def insert_feature_rows(db, rows):
+    # Core insert: one executemany per batch (the ORM insert splits a batch by its NULL pattern).
+    # Rows get the transaction's change version in stamp_changes()
+    rows = rows.assign(change_version=pending_change_version(db))
+    records = rows.astype(object).where(rows.notna(), None).to_dict('records')
+    for start in range(0, len(records), INSERT_BATCH_SIZE):
+        db.execute(FeatureRowDB.__table__.insert(), records[start:start + INSERT_BATCH_SIZE])
+
+
+def refresh_feature_rows(db, changes) -> int:
+    """
+    Incremental update after country-years were inserted or changed.
+    `changes` maps country_id -> changed years; for each country only the rows
+    from the year before the first change to MAX_LAG years after the last one
+    are recomputed. The caller commits.
+    """
+    changes = {cid: sorted(set(years)) for cid, years in changes.items() if years}
+    if not changes:
+        return 0
+
+    windows = {cid: (years[0] - 1, years[-1] + MAX_LAG) for cid, years in changes.items()}
+    source = load_source(db, list(changes),
+                         min(lo for lo, _ in windows.values()) - MAX_LAG,
+                         max(hi for _, hi in windows.values()) + 1)
+    rows = compute_feature_rows(source)
+
+    window_lo = rows['country_id'].map({cid: lo for cid, (lo, _) in windows.items()})
+    window_hi = rows['country_id'].map({cid: hi for cid, (_, hi) in windows.items()})
+    rows = rows[(rows['year'] >= window_lo) & (rows['year'] <= window_hi)]
+
+    for cid, (lo, hi) in windows.items():
+        db.query(FeatureRowDB).filter(FeatureRowDB.country_id == cid,
+                                      FeatureRowDB.year.between(lo, hi)).delete(synchronize_session=False)
+    insert_feature_rows(db, rows)
+    return len(rows)
+
+
+def rebuild(db) -> int:
+    FeatureRowDB.__table__.drop(bind=db.get_bind(), checkfirst=True)
+    FeatureRowDB.__table__.create(bind=db.get_bind())
+    rows = compute_feature_rows(load_source(db))
+    insert_feature_rows(db, rows)
+    # Nowa wersja: klienci z kursorem pobiorą całą przebudowaną tabelę
+    stamp_changes(db)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python feature_store.py rebuild")
+        sys.exit(1)
+
+    db = SessionLocal()
+    try:
+        built = rebuild(db)
+        db.commit()
+        print(f"✅ Feature store rebuilt: {built} rows.")
+    finally:
+        db.close()
@@ -0,0 +1,147 @@
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import config
+import model_registry
+from classification import classify_system_type, classify_risk
+from sql import SessionLocal, ForecastDB, FeatureRowDB
+
+
+class ModelCache:
+    """
+    Keeps the active model from the registry in memory. Every get() checks
+    the registry's ACTIVE pointer, so a newly activated version (or a
+    rollback) is swapped in without restarting the API.
+    """
+
+    def __init__(self):
+        self.bundle = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        version = model_registry.active_version()
+        if version is None:
+            return self.bundle
+
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.bundle = prepare_bundle(model_registry.load_version(version))
+                    self.version = version
+                    print(f"🧠 Model loaded: {version}")
+        return self.bundle
+
+
+def prepare_bundle(bundle):
+    if bundle['scaler'].columns != bundle['features']:
+        raise ValueError(f"Model {bundle['version']}: scaler columns do not match model features")
+    bundle['booster'] = bundle['model'].get_booster()
+    return bundle
+
+
+model_cache = ModelCache()
+
+
+def predict(bundle, x):
+    return np.clip(bundle['booster'].inplace_predict(bundle['scaler'].transform(x)), 0, 10)
+
+
+def forecast(features: dict, system_index: float):
+    """
+    Predicts next year's system_index from one country-year and applies the
+    regime and risk rules. Returns None when no model has been trained yet.
+    """
+    bundle = model_cache.get()
+    if bundle is None:
+        return None
+
+    predicted = float(predict(bundle, features)[0])
+
+    return {
+        "predicted_system_index": predicted,
+        "regime": classify_system_type(predicted),
+        "risk_class": classify_risk(predicted - system_index),
+        "model_version": bundle['version'],
+    }
+
+
+def latest_complete_rows(db, country_ids=None):
+    # Ostatni rok z kompletem wskaźników dla każdego kraju, w jednym zapytaniu do feature store
+    columns = ['country_id', 'year', config.TARGET_BASE] + config.MODEL_FEATURES
+    query = db.query(*[getattr(FeatureRowDB, col) for col in columns]).filter(
+        *[getattr(FeatureRowDB, col).isnot(None) for col in config.FEATURES + [config.TARGET_BASE]])
+    if country_ids is not None:
+        query = query.filter(FeatureRowDB.country_id.in_(country_ids))
+
+    df = pd.DataFrame(query.all(), columns=columns).astype({col: float for col in config.MODEL_FEATURES})
+    return df.sort_values('year').groupby('country_id').tail(1)
+
+
+def score_countries(db, country_ids=None) -> int:
+    """
+    Scores the latest complete year of the given countries (all when None)
+    with one predict call and upserts the results into the forecasts table.
+    The caller commits.
+    """
+    bundle = model_cache.get()
+    if bundle is None:
+        return 0
+
+    latest = latest_complete_rows(db, country_ids)
+    existing = db.query(ForecastDB)
+    if country_ids is not None:
+        existing = existing.filter(ForecastDB.country_id.in_(country_ids))
+    existing = {f.country_id: f for f in existing}
+
+    predicted = predict(bundle, latest[bundle['features']].to_numpy(dtype=float)) if len(latest) else []
+    scored_at = datetime.now(timezone.utc)
+
+    for row, pred in zip(latest.itertuples(index=False), predicted):
+        pred = float(pred)
+        current = float(getattr(row, config.TARGET_BASE))
+        forecast_row = existing.pop(row.country_id, None) or ForecastDB(country_id=int(row.country_id))
+        forecast_row.base_year = int(row.year)
+        forecast_row.forecast_year = int(row.year) + 1
+        forecast_row.system_index = current
+        forecast_row.predicted_system_index = pred
+        forecast_row.regime = classify_system_type(pred)
+        forecast_row.risk_class = classify_risk(pred - current)
+        forecast_row.model_version = bundle['version']
+        forecast_row.stale = False
+        forecast_row.scored_at = scored_at
+        db.add(forecast_row)
+
+    # Kraje bez kompletnego roku nie mają prognozy
+    for forecast_row in existing.values():
+        db.delete(forecast_row)
+
+    return len(latest)
+
+
+def mark_stale(db, country_ids):
+    if country_ids:
+        db.query(ForecastDB).filter(ForecastDB.country_id.in_(country_ids)).update(
+            {ForecastDB.stale: True}, synchronize_session=False)
+
+
+def rescore_countries(country_ids):
+    db = SessionLocal()
+    try:
+        score_countries(db, list(country_ids))
+        db.commit()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    db = SessionLocal()
+    try:
+        scored = score_countries(db)
+        db.commit()
+        print(f"✅ Scored {scored} countries.")
+    finally:
+        db.close()
@@ -0,0 +1,103 @@
+import argparse
+import io
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+BASE_URL = "http://127.0.0.1:8000"
+
+# Run against a development database: uploads create "Load test NNN" countries
+
+
+def synthetic_csv(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    years_per_country = 60
+    n_countries = max(1, rows // years_per_country)
+    df = pd.DataFrame({
+        'Country': np.repeat([f"Load test {i:03d}" for i in range(n_countries)], years_per_country),
+        'year': np.tile(np.arange(1965, 1965 + years_per_country), n_countries),
+    })
+    for col in ['press_free', 'freedom_index', 'gdp', 'absence_of_violence', 'civil_liberties',
+                'gov_stability', 'human_rights', 'electoral_integrity', 'system_index']:
+        df[col] = rng.uniform(0, 10, len(df)).round(4)
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+def percentile_ms(latencies, q):
+    return float(np.percentile(latencies, q) * 1000) if latencies else float('nan')
+
+
+def run_phase(base_url, path, readers, duration, upload_body=None, uploaders=0):
+    latencies, uploads, errors = [], [], []
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def reader():
+        session = requests.Session()
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                ok = session.get(base_url + path).ok
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                (latencies if ok else errors).append(elapsed)
+
+    def uploader():
+        session = requests.Session()
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                ok = session.post(f"{base_url}/ingest", files={'file': ("load_test.csv", upload_body, "text/csv")}).ok
+            except requests.RequestException:
+                ok = False
+            with lock:
+                (uploads if ok else errors).append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=uploader) for _ in range(uploaders)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        'requests': len(latencies),
+        'p50_ms': percentile_ms(latencies, 50),
+        'p95_ms': percentile_ms(latencies, 95),
+        'max_ms': max(latencies) * 1000 if latencies else float('nan'),
+        'uploads': len(uploads),
+        'errors': len(errors),
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Read latency of the API with and without concurrent uploads")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--path", default="/forecasts", help="GET endpoint measured by the readers")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--uploaders", type=int, default=2)
+    parser.add_argument("--upload-rows", type=int, default=20000)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    args = parser.parse_args()
+
+    body = synthetic_csv(args.upload_rows)
+    print(f"📤 Upload file: {len(body) / 1024 ** 2:.1f} MB, {args.upload_rows} rows")
+
+    idle = run_phase(args.base_url, args.path, args.readers, args.duration)
+    busy = run_phase(args.base_url, args.path, args.readers, args.duration, body, args.uploaders)
+
+    print(f"\n{'phase':<16}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'uploads':>9}{'errors':>8}")
+    for label, result in [("reads only", idle), ("with uploads", busy)]:
+        print(f"{label:<16}{result['requests']:>10}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}"
+              f"{result['max_ms']:>10.1f}{result['uploads']:>9}{result['errors']:>8}")
+    print(f"\np95 ratio (with uploads / reads only): {busy['p95_ms'] / idle['p95_ms']:.2f}x")
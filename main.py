@@ -1,15 +1,44 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Depends
+from fastapi import FastAPI, HTTPException, UploadFile, File, Depends, Query, BackgroundTasks, Request, Response
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 import csv
-from io import StringIO
-from typing import Optional
-
-from sql import SessionLocal, CountryDB, YearDataDB
-from blob_service import upload_file_to_blob
-
-app = FastAPI(title="POLKA – Political System Forecast API (Azure SQL Edition)")
+import io
+import json
+import orjson
+import shutil
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from sql import SessionLocal, get_engine, CountryDB, YearDataDB, ForecastDB, FeatureRowDB
+from blob_service import BackupSpool, get_blob_url, start_backup_service, upload_spooled_backup
+from forecast_service import forecast, mark_stale, model_cache, rescore_countries
+from feature_store import refresh_feature_rows
+from change_service import (changes_select, current_change_version, format_cursor, next_change_version, parse_cursor,
+                            pending_change_version, stamp_changes)
+from analytics_service import alerts_select, trends_select, year_rows, year_summary
+from response_cache import response_cache, etag_matches, make_etag
+from metrics import MetricsMiddleware, instrument_engine, record_ingest_rows, render_metrics
+import config
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Engine and pool are set up here, connections are opened by the first query.
+    # Schema changes are not applied at startup: run `python sql.py migrate`
+    instrument_engine(get_engine())
+    # Container check and leftover backups run beside startup, not in front of it
+    threading.Thread(target=start_backup_service, daemon=True).start()
+    await run_in_threadpool(model_cache.get)
+    yield
+
+
+app = FastAPI(title="POLKA – Political System Forecast API (Azure SQL Edition)", lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
 
 
 def get_db():
@@ -20,6 +49,20 @@ def get_db():
         db.close()
 
 
+# Nazwa kraju -> id. Kraje nie są usuwane ani przemianowywane, więc wpis jest ważny przez cały proces
+country_ids = {}
+
+
+def get_country_id(db: Session, name: str) -> int:
+    country_id = country_ids.get(name)
+    if country_id is None:
+        country_id = db.query(CountryDB.id).filter(CountryDB.name == name).scalar()
+        if country_id is None:
+            raise HTTPException(status_code=404, detail="Country not found")
+        country_ids[name] = country_id
+    return country_id
+
+
 class PoliticalIndicators(BaseModel):
     press_free: Optional[float] = None
     freedom_index: Optional[float] = None
@@ -32,6 +75,17 @@ class PoliticalIndicators(BaseModel):
     system_index: Optional[float] = None
 
 
+INDICATOR_COLUMNS = list(PoliticalIndicators.model_fields)
+PANEL_COLUMNS = ["Country", "year"] + INDICATOR_COLUMNS
+PANEL_BATCH_SIZE = 1000
+
+REQUIRED_CSV_COLUMNS = {"year", "press_free", "freedom_index", "gdp", "absence_of_violence",
+                        "electoral_integrity", "civil_liberties",
+                        "gov_stability", "human_rights", "electoral_integrity", "system_index"}
+CSV_CHUNK_SIZE = 1024 * 1024
+INGEST_BATCH_SIZE = 5000
+
+
 class YearCreate(BaseModel):
     year: int
     indicators: PoliticalIndicators
@@ -41,137 +95,680 @@ class CountryCreate(BaseModel):
     name: str
 
 
+def after_data_change(db: Session, background_tasks: BackgroundTasks, changes: dict):
+    """
+    Runs in the write transaction, right before commit. `changes` maps
+    country_id -> changed years: their feature rows are recomputed, their
+    forecasts marked stale and rescored after the response. Last, the
+    transaction takes its change version (nothing written, no new version).
+    """
+    changes = {country_id: years for country_id, years in changes.items() if years}
+    if not changes:
+        return
+    refresh_feature_rows(db, changes)
+    country_ids = sorted(changes)
+    mark_stale(db, country_ids)
+    stamp_changes(db)
+    background_tasks.add_task(rescore_countries, country_ids)
+
+
+def cached_json(request: Request, db: Session, key: str, build):
+    """
+    Serves a GET response from the response cache. The ETag is the data
+    version (change counter) read from the database, so a matching
+    If-None-Match gets 304 after that one lookup; `build()` runs only on a miss.
+    """
+    data_version = current_change_version(db)
+    etag = make_etag(data_version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    variant = str(request.url.query)
+    body = response_cache.get(key, variant, data_version)
+    if body is None:
+        body = orjson.dumps(build())
+        response_cache.put(key, variant, data_version, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def check_layout(layout: str):
+    if layout not in ("rows", "columns"):
+        raise HTTPException(status_code=400, detail="Layout must be 'rows' or 'columns'")
+
+
+def select_indicators(fields: Optional[List[str]], allowed: set) -> List[str]:
+    unknown = set(fields or []) - set(INDICATOR_COLUMNS) - allowed
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {sorted(unknown)}")
+    return [c for c in INDICATOR_COLUMNS if fields is None or c in fields]
+
+
+def shape_rows(columns: List[str], rows, layout: str):
+    # rows: one object per row; columns: one array per field (smaller, faster to parse)
+    if layout == "columns":
+        return {col: [row[i] for row in rows] for i, col in enumerate(columns)}
+    return [dict(zip(columns, row)) for row in rows]
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.post("/countries")
 def create_country(payload: CountryCreate, db: Session = Depends(get_db)):
-    existing = db.query(CountryDB).filter(CountryDB.name == payload.name).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Country already exists")
-
     new_country = CountryDB(name=payload.name)
     db.add(new_country)
-    db.commit()
+    # Nowy kraj zmienia /countries: licznik zmian unieważnia cache we wszystkich workerach
+    next_change_version(db)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Country already exists")
+    country_ids[payload.name] = new_country.id
     return {"status": "created", "country": payload.name}
 
 
 @app.get("/countries")
-def get_all_countries(db: Session = Depends(get_db)):
-    countries = db.query(CountryDB).all()
-    return [{"name": country.name} for country in countries]
+def get_all_countries(request: Request, db: Session = Depends(get_db)):
+    def build():
+        countries = db.query(CountryDB).all()
+        return [{"name": country.name} for country in countries]
 
+    return cached_json(request, db, "/countries", build)
 
-@app.post("/countries/{name}/year")
-def add_year(name: str, payload: YearCreate, db: Session = Depends(get_db)):
-    country = db.query(CountryDB).filter(CountryDB.name == name).first()
-    if not country:
-        raise HTTPException(status_code=404, detail="Country not found")
 
-    exists = db.query(YearDataDB).filter_by(country_id=country.id, year=payload.year).first()
-    if exists:
-        raise HTTPException(status_code=400, detail="Year already exists")
+@app.post("/countries/{name}/year")
+def add_year(name: str, payload: YearCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    country_id = get_country_id(db, name)
 
     new_data = YearDataDB(
-        country_id=country.id,
+        country_id=country_id,
         year=payload.year,
+        change_version=pending_change_version(db),
         **payload.indicators.model_dump()
     )
     db.add(new_data)
+    # Unikalny indeks (country_id, year) rozstrzyga duplikaty, także przy równoległych zapytaniach
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Year already exists")
+    after_data_change(db, background_tasks, {country_id: [payload.year]})
     db.commit()
 
     return {"status": "year added", "year": payload.year}
 
 
 @app.get("/countries/{name}")
-def get_country_data(name: str, db: Session = Depends(get_db)):
-    country = db.query(CountryDB).filter(CountryDB.name == name).first()
-    if not country:
-        raise HTTPException(status_code=404, detail="Country not found")
+def get_country_data(
+    name: str,
+    request: Request,
+    fields: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    offset: int = Query(0, ge=0),
+    layout: str = "rows",
+    db: Session = Depends(get_db),
+):
+    """
+    Years of one country, only the requested indicator columns. `layout=columns`
+    returns one array per field instead of one object per year.
+    """
+    check_layout(layout)
+    selected = ["year"] + select_indicators(fields, {"year"})
+
+    def build():
+        stmt = (
+            select(*[getattr(YearDataDB, c) for c in selected])
+            .where(YearDataDB.country_id == get_country_id(db, name))
+            .order_by(YearDataDB.year)
+        )
+        if year_from is not None:
+            stmt = stmt.where(YearDataDB.year >= year_from)
+        if year_to is not None:
+            stmt = stmt.where(YearDataDB.year <= year_to)
+        rows = db.execute(stmt.offset(offset).limit(limit)).all()
+        return {"data": shape_rows(selected, rows, layout)}
+
+    return cached_json(request, db, f"/countries/{name}", build)
+
+
+@app.get("/years/{year}")
+def get_year(year: int, request: Request, fields: Optional[List[str]] = Query(None), layout: str = "rows",
+             db: Session = Depends(get_db)):
+    """Indicators of every country in one year (a cross-section of the panel)."""
+    check_layout(layout)
+    selected = ["Country"] + select_indicators(fields, {"Country"})
+
+    def build():
+        rows = year_rows(db, year, selected[1:])
+        return {"year": year, "data": shape_rows(selected, rows, layout)}
+
+    return cached_json(request, db, f"/years/{year}", build)
+
+
+@app.get("/years/{year}/summary")
+def get_year_summary(year: int, request: Request, db: Session = Depends(get_db)):
+    """Mean, percentiles and regime band counts for one year, aggregated in SQL."""
+    return cached_json(request, db, f"/years/{year}/summary", lambda: year_summary(db, year, INDICATOR_COLUMNS))
+
+
+@app.get("/countries/{name}/trends")
+def get_country_trends(
+    name: str,
+    request: Request,
+    fields: Optional[List[str]] = Query(None),
+    window: int = Query(config.TREND_WINDOW, ge=2, le=20),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    layout: str = "rows",
+    db: Session = Depends(get_db),
+):
+    """
+    Year-over-year deltas and rolling means of the country's indicators, with
+    the risk class of each system_index change. Computed with SQL window
+    functions; the raw values are not returned.
+    """
+    check_layout(layout)
+    indicators = select_indicators(fields, set())
+
+    def build():
+        stmt = trends_select(get_country_id(db, name), indicators, window, year_from, year_to)
+        result = db.execute(stmt)
+        return {"window": window, "data": shape_rows(list(result.keys()), result.all(), layout)}
+
+    return cached_json(request, db, f"/countries/{name}/trends", build)
+
+
+@app.get("/alerts")
+def get_alerts(
+    request: Request,
+    risk_class: Optional[int] = None,
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Country-years whose system_index change reached CRISIS_THRESHOLD (risk_class 1)
+    or IMPROVEMENT_THRESHOLD (2), newest first.
+    """
+    if risk_class not in (None, 1, 2):
+        raise HTTPException(status_code=400, detail="risk_class must be 1 (crisis) or 2 (improvement)")
+    risk_classes = [risk_class] if risk_class else [1, 2]
+
+    def build():
+        rows = db.execute(alerts_select(risk_classes, year_from, year_to)).all()
+        return [
+            {"Country": country, "year": year, "system_index": value, "delta": delta, "risk_class": risk}
+            for country, year, value, delta, risk in rows
+        ]
+
+    return cached_json(request, db, "/alerts", build)
+
+
+@app.get("/countries/{name}/forecast")
+def get_country_forecast(name: str, db: Session = Depends(get_db)):
+    country_id = get_country_id(db, name)
+
+    # Najnowszy rok z kompletem wskaźników, gotowy wiersz z feature store
+    complete = [getattr(FeatureRowDB, col).isnot(None) for col in config.FEATURES + [config.TARGET_BASE]]
+    latest = (db.query(FeatureRowDB)
+              .filter(FeatureRowDB.country_id == country_id, *complete)
+              .order_by(FeatureRowDB.year.desc())
+              .first())
+    if not latest:
+        raise HTTPException(status_code=404, detail="No complete year of data for this country")
+
+    result = forecast({col: getattr(latest, col) for col in config.MODEL_FEATURES}, latest.system_index)
+    if result is None:
+        raise HTTPException(status_code=503, detail="Model not available")
 
-    records = db.query(YearDataDB).filter_by(country_id=country.id).order_by(YearDataDB.year).all()
+    return {
+        "country": name,
+        "base_year": latest.year,
+        "forecast_year": latest.year + 1,
+        "system_index": latest.system_index,
+        **result
+    }
+
+
+@app.get("/forecasts")
+def get_forecasts(risk_class: Optional[int] = None, regime: Optional[str] = None, db: Session = Depends(get_db)):
+    query = (db.query(ForecastDB, CountryDB.name)
+             .join(CountryDB, ForecastDB.country_id == CountryDB.id)
+             .order_by(CountryDB.name))
+    if risk_class is not None:
+        query = query.filter(ForecastDB.risk_class == risk_class)
+    if regime is not None:
+        query = query.filter(ForecastDB.regime == regime)
+
+    return [
+        {
+            "country": name,
+            "base_year": f.base_year,
+            "forecast_year": f.forecast_year,
+            "system_index": f.system_index,
+            "predicted_system_index": f.predicted_system_index,
+            "regime": f.regime,
+            "risk_class": f.risk_class,
+            "model_version": f.model_version,
+            "stale": f.stale,
+            "scored_at": f.scored_at,
+        }
+        for f, name in query
+    ]
+
+
+def stream_panel(stmt, columns: List[str], fmt: str):
+    # Own session: the request-scoped one may already be closed while the body streams
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(yield_per=PANEL_BATCH_SIZE))
+
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for batch in result.partitions():
+                writer.writerows(batch)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for batch in result.partitions():
+                yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in batch)
+    finally:
+        db.close()
 
-    data_list = []
-    for r in records:
-        row_dict = r.__dict__.copy()
-        row_dict.pop('_sa_instance_state', None)
-        data_list.append(row_dict)
 
-    return {"data": data_list}
+@app.get("/panel")
+def get_panel(
+    format: str = "csv",
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    countries: Optional[List[str]] = Query(None),
+    columns: Optional[List[str]] = Query(None),
+):
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'ndjson'")
+
+    unknown = set(columns or []) - set(PANEL_COLUMNS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {sorted(unknown)}")
+
+    selected = ["Country", "year"] + [c for c in INDICATOR_COLUMNS if columns is None or c in columns]
+    stmt = (
+        select(*[CountryDB.name if c == "Country" else getattr(YearDataDB, c) for c in selected])
+        .join(CountryDB, YearDataDB.country_id == CountryDB.id)
+        .order_by(CountryDB.name, YearDataDB.year)
+    )
+    if year_from is not None:
+        stmt = stmt.where(YearDataDB.year >= year_from)
+    if year_to is not None:
+        stmt = stmt.where(YearDataDB.year <= year_to)
+    if countries:
+        stmt = stmt.where(CountryDB.name.in_(countries))
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_panel(stmt, selected, format), media_type=media_type)
+
+
+def cursor_range(db: Session, since: Optional[str]):
+    """
+    (epoch, version, since_version) for a change-feed request: the current
+    counter and the validated cursor (None without one). 410 means the cursor
+    belongs to another database (or a reset one) and the client has to
+    download everything again.
+    """
+    epoch, version = current_change_version(db)
+    if since is None:
+        return epoch, version, None
+    try:
+        since_epoch, since_version = parse_cursor(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed cursor")
+    if since_epoch != epoch or since_version > version:
+        raise HTTPException(status_code=410, detail="Cursor no longer valid, download the full dataset")
+    return epoch, version, since_version
+
+
+@app.get("/features")
+def get_features(
+    format: str = "csv",
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    countries: Optional[List[str]] = Query(None),
+    since: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Feature store rows. With `since`, only the rows recomputed after that
+    cursor; the cursor for the next call is in the X-Change-Cursor header
+    (same feed as /changes).
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'ndjson'")
+
+    epoch, version, since_version = cursor_range(db, since)
+    selected = (["Country", "year", config.TARGET_BASE, config.TARGET_NEXT_YEAR]
+                + config.MODEL_FEATURES)
+    stmt = (
+        select(*[CountryDB.name if c == "Country" else getattr(FeatureRowDB, c) for c in selected])
+        .join(CountryDB, FeatureRowDB.country_id == CountryDB.id)
+        .where(FeatureRowDB.change_version <= version)
+        .order_by(CountryDB.name, FeatureRowDB.year)
+    )
+    if since_version is not None:
+        stmt = stmt.where(FeatureRowDB.change_version > since_version)
+    if year_from is not None:
+        stmt = stmt.where(FeatureRowDB.year >= year_from)
+    if year_to is not None:
+        stmt = stmt.where(FeatureRowDB.year <= year_to)
+    if countries:
+        stmt = stmt.where(CountryDB.name.in_(countries))
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_panel(stmt, selected, format), media_type=media_type,
+                             headers={"X-Change-Cursor": format_cursor(epoch, version)})
+
+
+@app.get("/changes")
+def get_changes(since: Optional[str] = None, format: str = "csv", db: Session = Depends(get_db)):
+    """
+    Country-years inserted or updated after the cursor `since`, in /panel's
+    columns; without `since`, every row. The cursor for the next call is in
+    the X-Change-Cursor header. 410 means the cursor belongs to another
+    database (or a reset one) and the client has to download everything again.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Format must be 'csv' or 'ndjson'")
+
+    epoch, version, since_version = cursor_range(db, since)
+    stmt = changes_select(PANEL_COLUMNS, since_version, version)
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_panel(stmt, PANEL_COLUMNS, format), media_type=media_type,
+                             headers={"X-Change-Cursor": format_cursor(epoch, version)})
+
+
+def parse_val(v):
+    if v is None:
+        return None
+    val_str = str(v).strip().lower()
+    if val_str == "" or val_str == "nan":
+        return None
+    return float(v)
+
+
+def parse_csv_row(row: dict) -> Optional[dict]:
+    # 1. BEZPIECZNE POBIERANIE ROKU
+    year_str = str(row.get("year", "")).strip()
+    # Jeśli brak roku lub rok to "nan", pomijamy całkowicie ten wiersz (jest bezużyteczny)
+    if not year_str or year_str.lower() == "nan":
+        return None
+
+    # Konwersja do float, a potem int pozwala uniknąć błędu, gdy rok to np. "2020.0"
+    year_val = int(float(year_str))
+
+    # 2. BEZPIECZNA KONWERSJA WSKAŹNIKÓW
+    indicators = PoliticalIndicators(
+        press_free=parse_val(row.get("press_free")),
+        freedom_index=parse_val(row.get("freedom_index")),
+        gdp=parse_val(row.get("gdp")),
+        absence_of_violence=parse_val(row.get("absence_of_violence")),
+        civil_liberties=parse_val(row.get("civil_liberties")),
+        gov_stability=parse_val(row.get("gov_stability")),
+        human_rights=parse_val(row.get("human_rights")),
+        electoral_integrity=parse_val(row.get("electoral_integrity")),
+        system_index=parse_val(row.get("system_index")),
+    )
+    return {"year": year_val, **indicators.model_dump()}
 
 
-@app.post("/countries/{name}/upload-csv")
-async def upload_csv(name: str, file: UploadFile = File(...), db: Session = Depends(get_db)):
-    country = db.query(CountryDB).filter(CountryDB.name == name).first()
-    if not country:
-        raise HTTPException(status_code=404, detail="Country not found")
+class TeeReader(io.RawIOBase):
+    """Binary stream that copies every chunk read from `source` into `sink`."""
 
-    if not file.filename.endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Not CSV file")
+    def __init__(self, source, sink):
+        self.source = source
+        self.sink = sink
 
-    file_content = await file.read()
-    blob_url = await run_in_threadpool(upload_file_to_blob, file_content, file.filename)
+    def readable(self):
+        return True
 
-    csv_text = file_content.decode("utf-8")
-    reader = csv.DictReader(StringIO(csv_text))
+    def readinto(self, buffer):
+        chunk = self.source.read(len(buffer))
+        self.sink.write(chunk)
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
 
-    years_added = 0
 
-    required_columns = {"year", "press_free", "freedom_index", "gdp", "absence_of_violence",
-                        "electoral_integrity", "civil_liberties",
-                        "gov_stability", "human_rights", "electoral_integrity", "system_index"}
+def open_csv_stream(source, sink) -> csv.DictReader:
+    stream = io.TextIOWrapper(io.BufferedReader(TeeReader(source, sink), CSV_CHUNK_SIZE),
+                              encoding="utf-8", newline="")
+    return csv.DictReader(stream)
+
+
+def get_existing_years(db: Session, country_id: int) -> set:
+    return {year for (year,) in db.query(YearDataDB.year).filter(YearDataDB.country_id == country_id)}
 
-    for col in required_columns:
-        if col not in reader.fieldnames:
+
+def ingest_csv_stream(db: Session, country_id: int, source, sink) -> List[int]:
+    """
+    Parses a CSV upload chunk by chunk (teeing the raw bytes into `sink`) and
+    inserts the years not yet stored for the country in fixed-size batches.
+    Returns the inserted years.
+    """
+    reader = open_csv_stream(source, sink)
+
+    for col in REQUIRED_CSV_COLUMNS:
+        if col not in (reader.fieldnames or []):
             raise HTTPException(status_code=400, detail=f"Missing column: {col}")
 
+    # Jedno zapytanie o istniejące lata zamiast jednego na każdy wiersz
+    seen_years = get_existing_years(db, country_id)
+    change_version = pending_change_version(db)
+    years_added = []
+    batch = []
+    rows_parsed = rows_skipped = 0
+
     for row in reader:
+        rows_parsed += 1
         try:
-            # 1. BEZPIECZNE POBIERANIE ROKU
-            year_str = str(row.get("year", "")).strip()
-            # Jeśli brak roku lub rok to "nan", pomijamy całkowicie ten wiersz (jest bezużyteczny)
-            if not year_str or year_str.lower() == "nan":
-                continue
-
-                # Konwersja do float, a potem int pozwala uniknąć błędu, gdy rok to np. "2020.0"
-            year_val = int(float(year_str))
-
-            # 2. BEZPIECZNA KONWERSJA WSKAŹNIKÓW
-            def parse_val(v):
-                if v is None:
-                    return None
-                val_str = str(v).strip().lower()
-                if val_str == "" or val_str == "nan":
-                    return None
-                return float(v)
-
-            indicators = PoliticalIndicators(
-                press_free=parse_val(row.get("press_free")),
-                freedom_index=parse_val(row.get("freedom_index")),
-                gdp=parse_val(row.get("gdp")),
-                absence_of_violence=parse_val(row.get("absence_of_violence")),
-                civil_liberties=parse_val(row.get("civil_liberties")),
-                gov_stability=parse_val(row.get("gov_stability")),
-                human_rights=parse_val(row.get("human_rights")),
-                electoral_integrity=parse_val(row.get("electoral_integrity")),
-                system_index=parse_val(row.get("system_index")),
-            )
-
-            if not db.query(YearDataDB).filter_by(country_id=country.id, year=year_val).first():
-                new_row = YearDataDB(
-                    country_id=country.id,
-                    year=year_val,
-                    **indicators.model_dump()
-                )
-                db.add(new_row)
-                years_added += 1
-
+            parsed = parse_csv_row(row)
         except Exception as e:
             # Jeśli cokolwiek wybuchnie, serwer dokładnie powie nam dlaczego
             print(f"Skipping row due to error: {e} | Row: {row}")
+            rows_skipped += 1
             continue
 
-    db.commit()
+        if parsed is None or parsed["year"] in seen_years:
+            rows_skipped += 1
+            continue
+
+        seen_years.add(parsed["year"])
+        batch.append({"country_id": country_id, "change_version": change_version, **parsed})
+
+        if len(batch) >= INGEST_BATCH_SIZE:
+            # Core insert: one executemany per batch. ORM insert(YearDataDB) leaves out None
+            # values and splits a sparse batch into one INSERT per NULL pattern
+            db.execute(YearDataDB.__table__.insert(), batch)
+            years_added += [row["year"] for row in batch]
+            batch = []
+
+    if batch:
+        db.execute(YearDataDB.__table__.insert(), batch)
+        years_added += [row["year"] for row in batch]
+
+    record_ingest_rows("upload-csv", parsed=rows_parsed, added=len(years_added), skipped=rows_skipped)
+    return years_added
+
+
+# Endpoints touching the database are plain `def`: FastAPI runs them in its
+# threadpool, so a long ingest never blocks the event loop serving other requests
+@app.post("/countries/{name}/upload-csv")
+def upload_csv(name: str, background_tasks: BackgroundTasks, file: UploadFile = File(...),
+               db: Session = Depends(get_db)):
+    country_id = get_country_id(db, name)
+
+    if not file.filename.endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Not CSV file")
+
+    # Starlette spools the upload to a temporary file; read it incrementally from there
+    # and keep a local copy that is archived to blob storage after the response
+    backup = BackupSpool(file.filename)
+    try:
+        years_added = ingest_csv_stream(db, country_id, file.file, backup)
+        after_data_change(db, background_tasks, {country_id: years_added})
+        db.commit()
+    except IntegrityError:
+        # Równoległy upload wstawił te same lata między odczytem a zapisem
+        backup.discard()
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Conflicting concurrent write, retry the upload")
+    except Exception:
+        backup.discard()
+        raise
+
+    blob_name = backup.commit()
+    background_tasks.add_task(upload_spooled_backup, blob_name)
 
     return {
         "status": "csv uploaded and processed",
-        "rows_added": years_added,
-        "backup_url": blob_url
-    }
\ No newline at end of file
+        "rows_added": len(years_added),
+        "backup_url": get_blob_url(blob_name),
+        "backup_status": "pending"
+    }
+
+
+def upsert_long_rows(db: Session, rows, columns: List[str]):
+    """
+    Upserts long-format rows (one per country-year, with a Country column):
+    missing countries are created in bulk, new years inserted and existing
+    years whose values differ from the stored ones updated, in batches of
+    INGEST_BATCH_SIZE. Returns the counts and the changed years per
+    country_id. The caller commits.
+    """
+    update_columns = [c for c in INDICATOR_COLUMNS if c in columns]
+    country_ids = dict(db.query(CountryDB.name, CountryDB.id).all())
+    # Stored values of the uploaded columns: a re-sent unchanged row is neither rewritten nor re-stamped
+    existing = {(country_id, year): (row_id, tuple(values)) for row_id, country_id, year, *values
+                in db.query(YearDataDB.id, YearDataDB.country_id, YearDataDB.year,
+                            *[getattr(YearDataDB, c) for c in update_columns])}
+    stats = {"countries_created": 0, "rows_added": 0, "rows_updated": 0, "rows_unchanged": 0, "rows_skipped": 0}
+    changes = {}
+    change_version = pending_change_version(db)
+
+    def flush(batch):
+        new_names = {name for name, _ in batch} - country_ids.keys()
+        if new_names:
+            db.execute(insert(CountryDB), [{"name": n} for n in sorted(new_names)])
+            country_ids.update(db.query(CountryDB.name, CountryDB.id).filter(CountryDB.name.in_(new_names)).all())
+            stats["countries_created"] += len(new_names)
+
+        inserts, updates = [], []
+        for name, parsed in batch:
+            key = (country_ids[name], parsed["year"])
+            if key in existing:
+                row_id, stored = existing[key]
+                values = tuple(parsed[c] for c in update_columns)
+                if values == stored:
+                    stats["rows_unchanged"] += 1
+                    continue
+                updates.append({"id": row_id, "change_version": change_version, **dict(zip(update_columns, values))})
+            else:
+                inserts.append({"country_id": key[0], "change_version": change_version, **parsed})
+            changes.setdefault(key[0], set()).add(key[1])
+
+        if inserts:
+            db.execute(YearDataDB.__table__.insert(), inserts)
+        if updates:
+            db.execute(update(YearDataDB), updates)
+
+        stats["rows_added"] += len(inserts)
+        stats["rows_updated"] += len(updates)
+
+    seen = set()
+    batch = []
+    for row in rows:
+        name = str(row.get("Country") or "").strip()
+        try:
+            parsed = parse_csv_row(row)
+        except Exception as e:
+            print(f"Skipping row due to error: {e} | Row: {row}")
+            parsed = None
+
+        if not name or name.lower() == "nan" or parsed is None or (name, parsed["year"]) in seen:
+            stats["rows_skipped"] += 1
+            continue
+
+        seen.add((name, parsed["year"]))
+        batch.append((name, parsed))
+        if len(batch) >= INGEST_BATCH_SIZE:
+            flush(batch)
+            batch = []
+
+    if batch:
+        flush(batch)
+
+    return stats, changes
+
+
+def ingest_file(db: Session, file: UploadFile, sink):
+    if file.filename.endswith(".parquet"):
+        import pandas as pd
+
+        shutil.copyfileobj(file.file, sink)
+        file.file.seek(0)
+        df = pd.read_parquet(file.file)
+        columns = list(df.columns)
+        rows = (row for start in range(0, len(df), INGEST_BATCH_SIZE)
+                for row in df.iloc[start:start + INGEST_BATCH_SIZE].to_dict("records"))
+    else:
+        reader = open_csv_stream(file.file, sink)
+        columns = reader.fieldnames or []
+        rows = reader
+
+    for col in ("Country", "year"):
+        if col not in columns:
+            raise HTTPException(status_code=400, detail=f"Missing column: {col}")
+
+    return upsert_long_rows(db, rows, columns)
+
+
+@app.post("/ingest")
+def ingest(background_tasks: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    if not file.filename.endswith((".csv", ".parquet")):
+        raise HTTPException(status_code=400, detail="Not CSV or Parquet file")
+
+    # Cały plik w jednej transakcji
+    backup = BackupSpool(file.filename)
+    try:
+        stats, changes = ingest_file(db, file, backup)
+        record_ingest_rows("ingest", parsed=sum(stats[k] for k in ("rows_added", "rows_updated", "rows_unchanged", "rows_skipped")),
+                           added=stats["rows_added"], updated=stats["rows_updated"],
+                           unchanged=stats["rows_unchanged"], skipped=stats["rows_skipped"])
+        after_data_change(db, background_tasks, changes)
+        db.commit()
+    except IntegrityError:
+        backup.discard()
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Conflicting concurrent write, retry the upload")
+    except Exception:
+        backup.discard()
+        raise
+
+    blob_name = backup.commit()
+    background_tasks.add_task(upload_spooled_backup, blob_name)
+
+    return {
+        "status": "file ingested",
+        **stats,
+        "backup_url": get_blob_url(blob_name),
+        "backup_status": "pending"
+    }
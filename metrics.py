@@ -0,0 +1,127 @@
+import os
+import time
+from contextvars import ContextVar
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, REGISTRY, generate_latest
+from sqlalchemy import event
+
+# Prometheus metrics of the API. With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR
+# (an empty directory), so /metrics aggregates all worker processes.
+
+REQUEST_SECONDS = Histogram(
+    "polka_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"])
+
+SQL_QUERY_SECONDS = Histogram(
+    "polka_db_query_duration_seconds", "Duration of a single SQL statement",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+SQL_QUERIES_PER_REQUEST = Histogram(
+    "polka_db_queries_per_request", "SQL statements executed by one HTTP request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500, 1000))
+SQL_SECONDS_PER_REQUEST = Histogram(
+    "polka_db_time_per_request_seconds", "Total SQL time of one HTTP request", ["route"])
+POOL_CHECKOUT_SECONDS = Histogram(
+    "polka_db_pool_checkout_seconds", "Time to get a connection from the pool (waiting + connecting)",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30))
+
+BLOB_UPLOAD_SECONDS = Histogram(
+    "polka_blob_upload_duration_seconds", "upload_file_to_blob duration",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120))
+BLOB_UPLOAD_FAILURES = Counter("polka_blob_upload_failures_total", "Failed backup upload attempts")
+
+INGEST_ROWS = Counter(
+    "polka_ingest_rows_total", "Rows seen by the upload endpoints", ["endpoint", "outcome"])
+
+# Per-request SQL counters; the dict is shared with the threadpool thread running the endpoint
+_request_sql = ContextVar("request_sql", default=None)
+
+
+def record_ingest_rows(endpoint, **counts):
+    for outcome, count in counts.items():
+        if count:
+            INGEST_ROWS.labels(endpoint, outcome).inc(count)
+
+
+def instrument_engine(engine):
+    # The engine outlives the app (tests, reloads): listeners and the pool wrapper go on once
+    if getattr(engine, "_polka_metrics", False):
+        return
+    engine._polka_metrics = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        SQL_QUERY_SECONDS.observe(elapsed)
+        stats = _request_sql.get()
+        if stats is not None:
+            stats["queries"] += 1
+            stats["seconds"] += elapsed
+
+    # Pool has no "before checkout" event, so the wait is measured around connect()
+    pool = engine.pool
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: latency and SQL statements per route template. Recorded
+    when the last body chunk is sent, so streamed responses are measured in
+    full and background tasks running after the response are not.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"queries": 0, "seconds": 0.0}
+        token = _request_sql.set(stats)
+        start = time.perf_counter()
+        state = {"status": 500, "recorded": False}
+
+        def record():
+            state["recorded"] = True
+            # Szablon ścieżki (/countries/{name}), nie konkretny URL - inaczej etykiet byłoby bez końca
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.labels(scope["method"], route, str(state["status"])).observe(time.perf_counter() - start)
+            SQL_QUERIES_PER_REQUEST.labels(route).observe(stats["queries"])
+            SQL_SECONDS_PER_REQUEST.labels(route).observe(stats["seconds"])
+
+        async def send_and_measure(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                record()
+
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            if not state["recorded"]:
+                record()
+            _request_sql.reset(token)
+
+
+def render_metrics():
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -2,75 +2,35 @@
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-from sklearn.preprocessing import MinMaxScaler
+import argparse
+import os
 from sklearn.metrics import mean_absolute_error, mean_squared_error, classification_report, confusion_matrix
 import matplotlib.pyplot as plt
 
-from data_analysis import full
-from api_download import fetch_full_dataframe
+from api_download import sync_feature_snapshot
+from classification import classify_system_type, classify_risk
+from preprocessing import FeatureScaler
 import config
+import model_registry
+from profiling import StageProfiler
 
 
 def prepare_data(df):
 
     df = df.sort_values(by=['Country', 'year'])
-    df[config.TARGET_NEXT_YEAR] = df.groupby('Country')[config.TARGET_BASE].shift(-1)
+    # Wiersze z feature store mają już cel t+1 i opóźnienia
+    if config.TARGET_NEXT_YEAR not in df.columns:
+        df[config.TARGET_NEXT_YEAR] = df.groupby('Country')[config.TARGET_BASE].shift(-1)
+    features = [col for col in config.MODEL_FEATURES if col in df.columns]
 
     cols_to_check = config.FEATURES + [config.TARGET_NEXT_YEAR]
     df_clean = df.dropna(subset=cols_to_check).copy()
 
-    X = df_clean[config.FEATURES].copy()
+    X = df_clean[features].copy()
     y = df_clean[config.TARGET_NEXT_YEAR]
 
     return X, y, df_clean
 
-def preprocess_features(data):
-
-    def scaling_symlog(data, columns):
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        for col in columns:
-            data[col] = np.sign(data[col]) * np.log1p(np.abs(data[col]))
-            data[col] = scaler.fit_transform(data[[col]])
-        return data
-
-    def scaling(data, columns):
-        scaler = MinMaxScaler(feature_range=(0, 1))
-        for col in columns:
-            data[col] = scaler.fit_transform(data[[col]])
-        return data
-
-    cols_full = ['gdp']
-    cols_standard = [
-        'press_free', 'freedom_index', 'absence_of_violence', 'civil_liberties',
-        'gov_stability', 'human_rights', 'electoral_integrity'
-    ]
-
-    data = scaling_symlog(data, cols_full)
-    data = scaling(data, cols_standard)
-
-    return data
-
-def classify_system_type(index):
-
-    if index > 8.0:
-        return "Full democracies"
-    elif index > 6.0:
-        return "Flawed democracies"
-    elif index > 4.0:
-        return "Hybrid regimes"
-    else:
-        return "Authoritarian regimes"
-
-def classify_risk(delta_y):
-
-    if delta_y <= config.CRISIS_THRESHOLD:
-        return 1  #🔴
-    elif delta_y >= config.IMPROVEMENT_THRESHOLD:
-        return 2  #🔵
-    else:
-        return 0  #🟢
-
-
 def evaluate_system(y_test, y_pred, eiu_current_test):
     """
     Step 4: Generating performance reports (ML + Strategy).
@@ -79,7 +39,7 @@ def evaluate_system(y_test, y_pred, eiu_current_test):
     print("\n" + "=" * 55)
     print("1. NUMERICAL PRECISION (Regression)")
     print("=" * 55)
-    print(f"Baseline MAE: {mean_absolute_error(y_test, y_baseline):.3f} EIU pts")
+    print(f"Baseline MAE: {mean_absolute_error(y_test, eiu_current_test):.3f} EIU pts")
     print(f"XGBoost Model MAE:  {mean_absolute_error(y_test, y_pred):.3f} EIU pts")
 
     # B. Evaluating the Early Warning System (Classification)
@@ -118,11 +78,11 @@ def evaluate_system(y_test, y_pred, eiu_current_test):
         }).head(5)
         print(przyklady.to_string())
 
-def plot_feature_importance(model):
+def plot_feature_importance(model, path=None):
 
     print("\n🧠 Generating feature importance chart (XAI)...")
     importance_df = pd.DataFrame({
-        'Feature': config.FEATURES,
+        'Feature': model.feature_names_in_,
         'Weight': model.feature_importances_
     }).sort_values(by='Weight', ascending=True)
 
@@ -131,34 +91,164 @@ def plot_feature_importance(model):
     plt.title("Importance of historical indicators for regime change (XGBoost)")
     plt.xlabel("Feature weight in decision trees")
     plt.tight_layout()
-    plt.show()
+    if path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        plt.savefig(path)
+        plt.close()
+        print(f"🖼️ Chart saved: {path}")
+    else:
+        plt.show()
 
 
-if __name__ == "__main__":
+def train_model(X_train, y_train, previous=None):
+    """
+    Full training, or - when `previous` (a registry bundle) is given - warm start:
+    config.WARM_START_ROUNDS more trees are boosted on top of its booster.
+    """
+    if previous is None:
+        params = dict(config.XGB_PARAMS)
+        model = xgb.XGBRegressor(**params)
+        model.fit(X_train, y_train)
+    else:
+        params = {**config.XGB_PARAMS, 'n_estimators': config.WARM_START_ROUNDS}
+        model = xgb.XGBRegressor(**params)
+        model.fit(X_train, y_train, xgb_model=previous['model'].get_booster())
+    return model, params
 
-    full_df = fetch_full_dataframe()
+
+def fit_holdout_model(X, y, holdout):
+    """
+    Metrics for a full retrain: a model fitted on the years before the
+    holdout (scaler included) predicts the holdout rows it has never seen.
+    """
+    scaler = FeatureScaler().fit(X[~holdout])
+    model, _ = train_model(scaler.transform(X[~holdout]), y[~holdout])
+    return model, scaler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the POLKA forecast model")
+    parser.add_argument("--mode", choices=["auto", "full", "warm"], default="auto",
+                        help="auto: warm start from the active model when its features match")
+    parser.add_argument("--force", action="store_true", help="train even if the data has not changed")
+    parser.add_argument("--holdout-years", type=int, default=2,
+                        help="full retrain: newest complete years held out to measure a model fitted without them")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every stage, write a JSON run report, save charts instead of showing them")
+    parser.add_argument("--profile-stage",
+                        help="dump a cProfile of this stage (e.g. train); implies --profile, slows that stage down")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="tracemalloc peak per stage; implies --profile, times of this run are inflated")
+    parser.add_argument("--report", help="run report path (default: profiles/run_<time>.json)")
+    args = parser.parse_args(argv)
+    args.profile = args.profile or bool(args.profile_stage) or args.profile_memory
+    return args
+
+
+def run(args, profiler):
+    """
+    One training run, stage by stage (each stage timed by `profiler`).
+    Returns a summary for the run report; used by __main__ and benchmarks/run.py.
+    """
+    with profiler.stage("fetch"):
+        # Local snapshot of /features; only rows recomputed since the last run are downloaded
+        full_df = sync_feature_snapshot()
 
     if full_df.empty:
         raise ValueError("Empty. Check API connection")
 
-    X, y, df_clean = prepare_data(full_df)
-
-    X_scaled_df = preprocess_features(X)
-
-    year_limit = 2019
+    with profiler.stage("prepare_data"):
+        X, y, df_clean = prepare_data(full_df)
+
+    # The model is trained on every complete country-year (target t+1 known),
+    # so each new year of data becomes training data
+    with profiler.stage("load_previous"):
+        data_hash = model_registry.hash_training_data(X, y)
+        train_rows = model_registry.training_rows(df_clean, X, y)
+        active = model_registry.active_version()
+        previous = model_registry.load_version(active) if active else None
+
+    if previous and previous['meta']['data_hash'] == data_hash and not args.force:
+        print(f"⏭️ Data unchanged since {active}, skipping training.")
+        return {'skipped': True, 'rows': len(X)}
+
+    warm = previous is not None and previous['features'] == list(X.columns) and args.mode != "full"
+    if args.mode == "warm" and not warm:
+        print("⚠️ No compatible active model, training from scratch.")
+
+    with profiler.stage("preprocess"):
+        if warm:
+            # Warm start boosts only on the rows the active model has not seen (new years,
+            # revised values), scaled exactly like the trees it continues
+            scaler = previous['scaler']
+            eval_mask = model_registry.unseen_rows(previous, train_rows)
+            X_new = scaler.transform(X[eval_mask])
+            y_new = y[eval_mask]
+        else:
+            holdout_from = int(df_clean['year'].max()) - args.holdout_years + 1
+            eval_mask = df_clean['year'] >= holdout_from
+            scaler = FeatureScaler().fit(X)
+            X_all = scaler.transform(X)
+
+    if warm and not eval_mask.any():
+        print(f"⏭️ No new or changed rows since {active}, skipping training.")
+        return {'skipped': True, 'rows': len(X)}
+
+    y_eval = y[eval_mask]
+    y_baseline = df_clean.loc[eval_mask, config.TARGET_BASE]
+
+    with profiler.stage("predict"):
+        # Test, then train: the evaluated model has never seen the evaluation rows
+        # (warm: the active model on the new rows; full: a model fitted before the holdout)
+        if warm:
+            y_pred = np.clip(previous['model'].predict(X_new), 0, 10)
+        else:
+            holdout_model, holdout_scaler = fit_holdout_model(X, y, eval_mask)
+            y_pred = np.clip(holdout_model.predict(holdout_scaler.transform(X[eval_mask])), 0, 10)
+
+    with profiler.stage("evaluate"):
+        evaluate_system(y_eval, y_pred, y_baseline)
+
+    with profiler.stage("train"):
+        if warm:
+            model, params = train_model(X_new, y_new, previous)
+        else:
+            model, params = train_model(X_all, y)
+
+    with profiler.stage("save_version"):
+        version = model_registry.save_version(model, scaler, {
+            'mode': 'warm' if warm else 'full',
+            'parent': active if warm else None,
+            'params': params,
+            'train_years': [int(df_clean['year'].min()), int(df_clean['year'].max())],
+            'n_train_rows': len(X),
+            'n_boosted_rows': int(eval_mask.sum()) if warm else len(X),
+            'data_hash': data_hash,
+            'metrics': {
+                'evaluated_on': 'new_rows' if warm else f'holdout_from_{holdout_from}',
+                'evaluated_model': active if warm else 'holdout_fit',
+                'n_rows': int(eval_mask.sum()),
+                'mae': float(mean_absolute_error(y_eval, y_pred)),
+                'baseline_mae': float(mean_absolute_error(y_eval, y_baseline)),
+            },
+        }, train_rows)
+        model_registry.set_active(version)
+
+    with profiler.stage("plot"):
+        chart = os.path.join(profiler.output_dir, f"feature_importance_{version}.png") if args.profile else None
+        plot_feature_importance(model, chart)
+
+    return {'version': version, 'mode': 'warm' if warm else 'full',
+            'rows': len(X), 'evaluated_rows': int(eval_mask.sum())}
 
-    X_train = X_scaled_df[df_clean['year'] < year_limit]
-    y_train = y[df_clean['year'] < year_limit]
 
-    X_test = X_scaled_df[df_clean['year'] >= year_limit]
-    y_test = y[df_clean['year'] >= year_limit]
-
-    y_baseline = df_clean.loc[X_test.index, config.TARGET_BASE]
-
-    model = xgb.XGBRegressor(**config.XGB_PARAMS)
-    model.fit(X_train, y_train)
+if __name__ == "__main__":
 
-    y_pred = np.clip(model.predict(X_test), 0, 10)
+    args = parse_args()
+    profiler = StageProfiler(enabled=args.profile, cprofile_stage=args.profile_stage,
+                             trace_memory=args.profile_memory)
+    if args.profile:
+        plt.switch_backend("Agg")
 
-    evaluate_system(y_test, y_pred, y_baseline)
-    plot_feature_importance(model)
\ No newline at end of file
+    summary = run(args, profiler)
+    profiler.write_report(args.report, **summary)
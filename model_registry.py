@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import joblib
+import pandas as pd
+
+import config
+from preprocessing import FeatureScaler
+
+# models/
+#   v0001/model.json           XGBoost booster
+#   v0001/preprocessing.json   fitted FeatureScaler (training window only)
+#   v0001/meta.json            params, training window, metrics, data hash
+#   v0001/train_rows.parquet   Country, year and hash of every training row (for warm start)
+#   ACTIVE                     name of the version served by the API
+
+
+def version_dir(version):
+    return os.path.join(config.MODEL_DIR, version)
+
+
+def active_path():
+    return os.path.join(config.MODEL_DIR, "ACTIVE")
+
+
+def list_versions():
+    if not os.path.isdir(config.MODEL_DIR):
+        return []
+    return sorted(name for name in os.listdir(config.MODEL_DIR)
+                  if name.startswith("v") and os.path.exists(os.path.join(version_dir(name), "meta.json")))
+
+
+def active_version():
+    try:
+        with open(active_path()) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_meta(version):
+    with open(os.path.join(version_dir(version), "meta.json")) as f:
+        return json.load(f)
+
+
+def load_version(version):
+    # xgboost is imported when a model is loaded, so importing the API stays cheap
+    import xgboost as xgb
+
+    model = xgb.XGBRegressor()
+    model.load_model(os.path.join(version_dir(version), "model.json"))
+    meta = load_meta(version)
+    scaler_path = os.path.join(version_dir(version), "preprocessing.json")
+    if os.path.exists(scaler_path):
+        scaler = FeatureScaler.load(scaler_path)
+    else:
+        scaler = FeatureScaler.from_scalers(
+            joblib.load(os.path.join(version_dir(version), "preprocessing.joblib")), meta['features'])
+    rows_path = os.path.join(version_dir(version), "train_rows.parquet")
+    return {
+        'model': model,
+        'scaler': scaler,
+        'features': meta['features'],
+        'version': version,
+        'meta': meta,
+        'train_rows': pd.read_parquet(rows_path) if os.path.exists(rows_path) else None,
+    }
+
+
+def hash_rows(X, y):
+    return pd.util.hash_pandas_object(pd.concat([X, y], axis=1), index=False)
+
+
+def hash_training_data(X, y):
+    digest = hashlib.sha256(hash_rows(X, y).values.tobytes())
+    digest.update(json.dumps(list(X.columns)).encode())
+    return digest.hexdigest()
+
+
+def training_rows(keys, X, y):
+    # keys: Country and year of each row of X
+    return pd.DataFrame({'Country': keys['Country'].values, 'year': keys['year'].values,
+                         'row_hash': hash_rows(X, y).values}, index=X.index)
+
+
+def unseen_rows(previous, rows):
+    """
+    Mask of `rows` (from training_rows) that the previous version did not
+    train on: new country-years and rows whose values changed. Versions saved
+    without train_rows.parquet fall back to the years after their training window.
+    """
+    if previous['train_rows'] is None:
+        return rows['year'] > previous['meta']['train_years'][1]
+    seen = rows.merge(previous['train_rows'], on=['Country', 'year', 'row_hash'], how='left', indicator=True)
+    return pd.Series(seen['_merge'].values == 'left_only', index=rows.index)
+
+
+def save_version(model, scaler, meta, train_rows=None):
+    """
+    Stores a trained model as the next version. Files go to a temp directory
+    that is renamed at the end, so a listed version is always complete.
+    """
+    versions = list_versions()
+    version = f"v{int(versions[-1][1:]) + 1 if versions else 1:04d}"
+    tmp_dir = version_dir(version) + ".tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    model.save_model(os.path.join(tmp_dir, "model.json"))
+    scaler.save(os.path.join(tmp_dir, "preprocessing.json"))
+    if train_rows is not None:
+        train_rows.to_parquet(os.path.join(tmp_dir, "train_rows.parquet"), index=False)
+    meta = {
+        'version': version,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'features': list(model.feature_names_in_),
+        **meta,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    os.replace(tmp_dir, version_dir(version))
+    print(f"💾 Model saved: {version_dir(version)}")
+    return version
+
+
+def set_active(version):
+    if version not in list_versions():
+        raise ValueError(f"Unknown model version: {version}")
+    with open(active_path() + ".tmp", "w") as f:
+        f.write(version)
+    os.replace(active_path() + ".tmp", active_path())
+    print(f"✅ Active model: {version}")
+
+
+def rollback():
+    # Wraca do wersji poprzedzającej aktywną
+    versions = list_versions()
+    current = active_version()
+    if current not in versions or versions.index(current) == 0:
+        raise ValueError("No earlier version to roll back to")
+    set_active(versions[versions.index(current) - 1])
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+
+    if command == "list":
+        current = active_version()
+        for version in list_versions():
+            meta = load_meta(version)
+            marker = "*" if version == current else " "
+            print(f"{marker} {version}  {meta['created_at']}  {meta['mode']:<10} "
+                  f"years {meta['train_years'][0]}-{meta['train_years'][1]}  MAE {meta['metrics'].get('mae', float('nan')):.3f}")
+    elif command == "activate" and len(sys.argv) == 3:
+        set_active(sys.argv[2])
+    elif command == "rollback":
+        rollback()
+    else:
+        print("Usage: python model_registry.py [list | activate <version> | rollback]")
+        sys.exit(1)
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Heavy-tailed indicators (and their lags/deltas) are SymLog-compressed before scaling
+COLS_SYMLOG = ['gdp']
+
+
+def is_symlog(col):
+    return col in COLS_SYMLOG or any(col.startswith(f"{base}_") for base in COLS_SYMLOG)
+
+
+def symlog(values):
+    return np.sign(values) * np.log1p(np.abs(values))
+
+
+class FeatureScaler:
+    """
+    SymLog + Min-Max scaling of a fixed list of feature columns, kept as three
+    vectors so a batch or a single row is scaled in one numpy expression.
+    Fit it on the training window only and save it next to the model; the
+    scorer loads it back instead of refitting on the full panel.
+    """
+
+    def __init__(self, columns=None, scale=None, offset=None):
+        self.columns = list(columns) if columns is not None else None
+        self.symlog = np.array([is_symlog(col) for col in self.columns]) if self.columns is not None else None
+        self.scale = np.asarray(scale, dtype=float) if scale is not None else None
+        self.offset = np.asarray(offset, dtype=float) if offset is not None else None
+
+    def fit(self, data: pd.DataFrame):
+        self.columns = list(data.columns)
+        self.symlog = np.array([is_symlog(col) for col in self.columns])
+        values = self._symlog(data.to_numpy(dtype=float))
+
+        low, high = np.nanmin(values, axis=0), np.nanmax(values, axis=0)
+        # Stała kolumna dostaje skalę 1, jak w MinMaxScaler
+        span = np.where(high - low > 0, high - low, 1.0)
+        self.scale = 1.0 / span
+        self.offset = -low * self.scale
+        return self
+
+    def _symlog(self, values):
+        return np.where(self.symlog, symlog(values), values)
+
+    def transform(self, data):
+        """
+        Scales a DataFrame (columns picked by name, result keeps the index),
+        a dict of one row, or an array already in `columns` order.
+        """
+        if isinstance(data, pd.DataFrame):
+            values = self.transform(data[self.columns].to_numpy(dtype=float))
+            return pd.DataFrame(values, index=data.index, columns=self.columns)
+        if isinstance(data, dict):
+            data = np.array([[data[col] for col in self.columns]], dtype=float)
+
+        return self._symlog(np.asarray(data, dtype=float)) * self.scale + self.offset
+
+    def fit_transform(self, data: pd.DataFrame):
+        return self.fit(data).transform(data)
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({'columns': self.columns, 'scale': self.scale.tolist(), 'offset': self.offset.tolist()}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            state = json.load(f)
+        return cls(state['columns'], state['scale'], state['offset'])
+
+    @classmethod
+    def from_scalers(cls, scalers, columns):
+        # Wersje modeli zapisane przed FeatureScaler: słownik MinMaxScaler na kolumnę
+        return cls(columns, [scalers[col].scale_[0] for col in columns], [scalers[col].min_[0] for col in columns])
@@ -0,0 +1,95 @@
+import cProfile
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float('nan')
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 ** 2 if sys.platform == 'darwin' else rss / 1024
+
+
+class StageProfiler:
+    """
+    Wall time and CPU time per named stage of a script, plus the process RSS
+    peak so far. tracemalloc hooks every allocation and slows Python/pandas
+    code down, so the tracemalloc peak of a stage (Python and numpy
+    allocations; native XGBoost buffers only show in the RSS) is measured
+    only with trace_memory, in a run whose times are not comparable.
+    Disabled, stage() costs nothing.
+    """
+
+    def __init__(self, enabled=False, cprofile_stage=None, output_dir="profiles", trace_memory=False):
+        self.enabled = enabled
+        self.cprofile_stage = cprofile_stage
+        self.output_dir = output_dir
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        profiler = cProfile.Profile() if name == self.cprofile_stage else None
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+            wall_s, cpu_s = time.perf_counter() - wall, time.process_time() - cpu
+            peak_mb = None
+            if self.trace_memory:
+                peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+                tracemalloc.stop()
+            self.stages.append({
+                'stage': name,
+                'wall_s': round(wall_s, 4),
+                'cpu_s': round(cpu_s, 4),
+                'peak_mb': peak_mb,
+                'rss_peak_mb': round(peak_rss_mb(), 1),
+            })
+            if profiler:
+                os.makedirs(self.output_dir, exist_ok=True)
+                path = os.path.join(self.output_dir, f"{name}.prof")
+                profiler.dump_stats(path)
+                print(f"🔬 cProfile of '{name}' saved: {path} (python -m pstats {path})")
+
+    def write_report(self, path=None, **extra):
+        if not self.enabled:
+            return None
+        path = path or os.path.join(self.output_dir, f"run_{datetime.now():%Y%m%d_%H%M%S}.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        report = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            'trace_memory': self.trace_memory,
+            'cprofile_stage': self.cprofile_stage,
+            'stages': self.stages,
+            'total_wall_s': round(sum(s['wall_s'] for s in self.stages), 4),
+            **extra,
+        }
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        memory = 'peak MB' if self.trace_memory else 'RSS MB'
+        print(f"\n{'stage':<16}{'wall s':>9}{'cpu s':>9}{memory:>10}")
+        for s in self.stages:
+            mb = s['peak_mb'] if self.trace_memory else s['rss_peak_mb']
+            print(f"{s['stage']:<16}{s['wall_s']:>9.2f}{s['cpu_s']:>9.2f}{mb:>10.1f}")
+        print(f"📝 Run report: {path}")
+        return path
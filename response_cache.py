@@ -0,0 +1,51 @@
+import os
+import threading
+from collections import OrderedDict
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+
+
+class ResponseCache:
+    """
+    In-process LRU cache of serialized GET responses. Entries are stored under
+    the data version they were built from: the change counter (epoch and
+    version, change_service.py) read from the database on every request.
+    Any committed write bumps the counter, so it makes older entries miss in
+    every worker process, not only in the one that handled the write. One key
+    can hold several entries (`variant`, e.g. the query string).
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, variant, data_version):
+        with self.lock:
+            entry = self.entries.get((key, variant))
+            if entry is None or entry[0] != data_version:
+                return None
+            self.entries.move_to_end((key, variant))
+            return entry[1]
+
+    def put(self, key, variant, data_version, body):
+        with self.lock:
+            self.entries[(key, variant)] = (data_version, body)
+            self.entries.move_to_end((key, variant))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+response_cache = ResponseCache()
+
+
+def make_etag(data_version):
+    epoch, version = data_version
+    return f'"{epoch}-{version}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
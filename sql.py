@@ -1,16 +1,64 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, ForeignKey
+import sys
+import threading
+import uuid
+from sqlalchemy import create_engine, event, make_url, inspect, select, text, Column, Integer, BigInteger, String, Float, ForeignKey, Boolean, DateTime, Index
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from dotenv import load_dotenv
 
+import config
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("No DATABASE_URL in file .env!")
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Connection pool, tunable per deployment. Each API thread holds one connection
+# for the whole request, so size + overflow caps concurrent DB requests
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+
+def engine_options(url):
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+    # SQLite (tests, local runs) keeps SQLAlchemy's default pool for its driver
+    if make_url(url).get_backend_name() != "sqlite":
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    The engine is created on first use, not at import: importing the models
+    needs neither DATABASE_URL nor a reachable server, and no connection is
+    opened until the first query.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                if not DATABASE_URL:
+                    raise ValueError("No DATABASE_URL in file .env!")
+                engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+                if engine.dialect.name == "sqlite":
+                    # WAL: readers are not blocked while an ingest holds the write lock
+                    event.listen(engine, "connect", lambda dbapi_connection, record:
+                                 dbapi_connection.execute("PRAGMA journal_mode=WAL"))
+                _engine = engine
+    return _engine
+
+
+_session_factory = sessionmaker(autocommit=False, autoflush=False)
+
+
+def SessionLocal():
+    return _session_factory(bind=get_engine())
+
 
 Base = declarative_base()
 
@@ -25,6 +73,8 @@ class CountryDB(Base):
 
 class YearDataDB(Base):
     __tablename__ = "political_data"
+    # One row per country-year; also serves every per-country lookup as an index seek
+    __table_args__ = (Index("ux_political_data_country_year", "country_id", "year", unique=True),)
 
     id = Column(Integer, primary_key=True, index=True)
     year = Column(Integer, index=True)
@@ -42,4 +92,103 @@ class YearDataDB(Base):
     electoral_integrity = Column(Float)
     system_index = Column(Float)
 
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+    # Value of change_counter.version of the transaction that last wrote the row (change_service.py)
+    change_version = Column(BigInteger, nullable=False, default=0, server_default="0", index=True)
+
+
+class ChangeCounterDB(Base):
+    # Single row; every write to political_data increments it. The epoch tells
+    # databases apart, so a cursor from another database is not applied here
+    __tablename__ = "change_counter"
+
+    id = Column(Integer, primary_key=True)
+    epoch = Column(String(32), nullable=False)
+    version = Column(BigInteger, nullable=False, default=0)
+
+
+class ForecastDB(Base):
+    __tablename__ = "forecasts"
+
+    country_id = Column(Integer, ForeignKey("countries.id"), primary_key=True)
+    base_year = Column(Integer)
+    forecast_year = Column(Integer)
+    system_index = Column(Float)
+    predicted_system_index = Column(Float)
+    regime = Column(String(50), index=True)
+    risk_class = Column(Integer, index=True)
+    model_version = Column(String(50))
+    stale = Column(Boolean, default=False, nullable=False)
+    scored_at = Column(DateTime)
+
+    country = relationship("CountryDB")
+
+# Ready-made model rows: target for t+1 plus lags/deltas of config.FEATURES.
+# Columns follow config, so after changing FEATURE_LAGS run `python feature_store.py rebuild`.
+FeatureRowDB = type("FeatureRowDB", (Base,), {
+    "__tablename__": "political_features",
+    "country_id": Column(Integer, ForeignKey("countries.id"), primary_key=True),
+    "year": Column(Integer, primary_key=True),
+    config.TARGET_BASE: Column(Float),
+    config.TARGET_NEXT_YEAR: Column(Float),
+    **{col: Column(Float) for col in config.MODEL_FEATURES},
+    # Version of the transaction that last recomputed the row, as in political_data (feed: GET /features?since=)
+    "change_version": Column(BigInteger, nullable=False, default=0, server_default="0", index=True),
+})
+
+
+def ensure_indexes():
+    """
+    create_all() does not touch tables that already exist, so indexes added to
+    the models later are created here. Before the unique (country_id, year)
+    index, duplicate country-years are removed, keeping the oldest row.
+    """
+    tables = (YearDataDB.__table__, FeatureRowDB.__table__)
+    existing = {index["name"] for table in tables for index in inspect(get_engine()).get_indexes(table.name)}
+    for index in [index for table in tables for index in table.indexes]:
+        if index.name in existing:
+            continue
+        with get_engine().begin() as conn:
+            if index.name == "ux_political_data_country_year":
+                removed = conn.execute(text(
+                    "DELETE FROM political_data WHERE id NOT IN "
+                    "(SELECT MIN(id) FROM political_data GROUP BY country_id, year)")).rowcount
+                if removed:
+                    print(f"🧹 Removed {removed} duplicate country-year rows")
+            index.create(bind=conn)
+        print(f"🗄️ Created index {index.name}")
+
+
+def ensure_columns():
+    # Kolumny dodane do modeli po utworzeniu tabeli; istniejące wiersze dostają change_version 0
+    for table in (YearDataDB.__table__, FeatureRowDB.__table__):
+        existing = {column["name"] for column in inspect(get_engine()).get_columns(table.name)}
+        if "change_version" in existing:
+            continue
+        with get_engine().begin() as conn:
+            column_type = BigInteger().compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD change_version {column_type} NOT NULL DEFAULT 0"))
+        print(f"🗄️ Added column {table.name}.change_version")
+
+
+def ensure_change_counter():
+    with get_engine().begin() as conn:
+        if conn.execute(select(ChangeCounterDB.id)).first() is None:
+            conn.execute(ChangeCounterDB.__table__.insert().values(id=1, epoch=uuid.uuid4().hex, version=0))
+            print("🗄️ Created change counter")
+
+
+def migrate():
+    # Tabele i indeksy; uruchamiane osobno (python sql.py migrate), nie przy imporcie
+    Base.metadata.create_all(bind=get_engine())
+    ensure_columns()
+    ensure_indexes()
+    ensure_change_counter()
+    print("✅ Database schema up to date.")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["migrate"]:
+        migrate()
+    else:
+        print("Usage: python sql.py migrate")
+        sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from sklearn.metrics import mean_absolute_error
+from sklearn.model_selection import ParameterSampler
+
+from api_download import sync_feature_snapshot
+from model_pipeline import prepare_data
+from preprocessing import FeatureScaler
+import config
+
+# Rolling origin: for each cutoff, train on years < cutoff and score the next HORIZON years
+CUTOFF_YEARS = [2011, 2013, 2015, 2017, 2019]
+HORIZON = 2
+EARLY_STOPPING_ROUNDS = 50
+MAX_ESTIMATORS = 2000
+
+PARAM_SPACE = {
+    'max_depth': [3, 4, 5, 6, 8],
+    'learning_rate': [0.01, 0.02, 0.05, 0.1],
+    'min_child_weight': [1, 3, 5, 10],
+    'subsample': [0.6, 0.8, 1.0],
+    'colsample_bytree': [0.6, 0.8, 1.0],
+    'reg_lambda': [0.5, 1.0, 5.0],
+}
+
+LEADERBOARD_PATH = "tuning/leaderboard.csv"
+
+# Dane ładowane raz na proces roboczy (initializer), nie przy każdym zadaniu
+_data = {}
+
+
+def init_worker(X, y, years):
+    _data['X'], _data['y'], _data['years'] = X, y, years
+
+
+def evaluate_params(params, n_jobs):
+    """
+    Rolling-origin CV of one parameter set. Inside every fold the scaling is
+    fitted on the training years only and the last training year is held out
+    for early stopping, so the scored years never influence the fit.
+    """
+    X, y, years = _data['X'], _data['y'], _data['years']
+    fold_mae, best_iterations = [], []
+
+    for cutoff in CUTOFF_YEARS:
+        fit_mask = years < cutoff - 1
+        stop_mask = years == cutoff - 1
+        test_mask = (years >= cutoff) & (years < cutoff + HORIZON)
+        if not (fit_mask.any() and stop_mask.any() and test_mask.any()):
+            continue
+
+        scaler = FeatureScaler().fit(X[fit_mask])
+        X_fit, X_stop, X_test = (scaler.transform(X[mask]) for mask in (fit_mask, stop_mask, test_mask))
+
+        model = xgb.XGBRegressor(**{**config.XGB_PARAMS, **params, 'n_estimators': MAX_ESTIMATORS},
+                                 early_stopping_rounds=EARLY_STOPPING_ROUNDS, n_jobs=n_jobs)
+        model.fit(X_fit, y[fit_mask], eval_set=[(X_stop, y[stop_mask])], verbose=False)
+
+        y_pred = np.clip(model.predict(X_test), 0, 10)
+        fold_mae.append(mean_absolute_error(y[test_mask], y_pred))
+        best_iterations.append(model.best_iteration + 1)
+
+    return {
+        'params': params,
+        'mean_mae': float(np.mean(fold_mae)),
+        'std_mae': float(np.std(fold_mae)),
+        'n_estimators': int(np.mean(best_iterations)),
+        'fold_mae': [round(float(m), 4) for m in fold_mae],
+    }
+
+
+def write_config(params, path="config.py"):
+    # Podmienia blok XGB_PARAMS w config.py na najlepsze parametry
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+
+    block = "XGB_PARAMS = {\n" + ",\n".join(f"    {key!r}: {value!r}" for key, value in params.items()) + "\n}"
+    source, count = re.subn(r"XGB_PARAMS = \{.*?\n\}", lambda _: block, source, count=1, flags=re.S)
+    if count != 1:
+        raise ValueError("XGB_PARAMS block not found in config.py")
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    print(f"✅ config.XGB_PARAMS updated: {params}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Time-series CV hyperparameter search for XGBoost")
+    parser.add_argument("--n-iter", type=int, default=40, help="parameter sets to try")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="parallel model fits")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--write-config", action="store_true", help="write the best params to config.py")
+    args = parser.parse_args()
+
+    # Każdy model dostaje swoją część rdzeni, żeby procesy nie walczyły o CPU
+    workers = max(1, min(args.workers, args.n_iter))
+    n_jobs = max(1, (os.cpu_count() or 1) // workers)
+
+    X, y, df_clean = prepare_data(sync_feature_snapshot())
+    years = df_clean['year'].to_numpy()
+    candidates = list(ParameterSampler(PARAM_SPACE, n_iter=args.n_iter, random_state=args.seed))
+
+    print(f"🔎 {len(candidates)} parameter sets x {len(CUTOFF_YEARS)} folds, "
+          f"{workers} workers x {n_jobs} threads")
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(X, y, years)) as pool:
+        results = list(pool.map(evaluate_params, candidates, [n_jobs] * len(candidates)))
+
+    leaderboard = pd.DataFrame(results).sort_values('mean_mae').reset_index(drop=True)
+    leaderboard['params'] = leaderboard['params'].apply(json.dumps)
+    os.makedirs(os.path.dirname(LEADERBOARD_PATH), exist_ok=True)
+    leaderboard.to_csv(LEADERBOARD_PATH, index=False)
+
+    print(f"⏱️ Search finished in {time.perf_counter() - start:.1f}s, leaderboard: {LEADERBOARD_PATH}")
+    print(leaderboard.head(5).to_string())
+
+    if args.write_config:
+        best = results[int(np.argmin([r['mean_mae'] for r in results]))]
+        write_config({**config.XGB_PARAMS, **best['params'], 'n_estimators': best['n_estimators']})